@@ -2,19 +2,17 @@
 Data Analysis Script for Member Messages
 Identifies anomalies and inconsistencies in the dataset.
 """
-import requests
 import json
 from collections import defaultdict, Counter
 from datetime import datetime
 import re
 
+from messages_api import iter_messages
+
 
 def fetch_all_messages():
-    """Fetch all messages from the API."""
-    url = "https://november7-730026606190.europe-west1.run.app/messages"
-    response = requests.get(url, timeout=30)
-    response.raise_for_status()
-    return response.json().get("items", [])
+    """Fetch all messages from the API, page by page."""
+    return list(iter_messages())
 
 
 def analyze_data():
@@ -0,0 +1,108 @@
+"""
+LRU/TTL cache of answers to repeated questions.
+
+Keys combine a normalized form of the question with the version of the
+messages snapshot the answer was computed from, so a data refresh that
+changes the messages makes older entries unreachable; they then age out via
+LRU eviction or their TTL.
+"""
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from message_index import tokenize
+
+
+def normalize_question(question: str) -> str:
+    """Case-, punctuation- and whitespace-insensitive form of a question."""
+    return " ".join(tokenize(question))
+
+
+class AnswerCache:
+    """Bounded by entry count and by the approximate memory used by keys and answers."""
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 600, max_bytes: int = 4 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (answer, expires_at, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.max_bytes > 0
+
+    @staticmethod
+    def make_key(question: str, *parts) -> tuple:
+        return (normalize_question(question),) + parts
+
+    def get(self, key: tuple) -> Optional[str]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            answer, expires_at, size = entry
+            if self.ttl > 0 and expires_at < time.monotonic():
+                self._remove(key, size)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return answer
+
+    def put(self, key: tuple, answer: str):
+        if not self.enabled:
+            return
+        size = self._entry_size(key, answer)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+            self._entries[key] = (answer, time.monotonic() + self.ttl, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                old_key, (_, _, old_size) = self._entries.popitem(last=False)
+                self._bytes -= old_size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _remove(self, key: tuple, size: int):
+        del self._entries[key]
+        self._bytes -= size
+
+    @staticmethod
+    def _entry_size(key: tuple, answer: str) -> int:
+        return sys.getsizeof(answer) + sum(sys.getsizeof(part) for part in key) + sys.getsizeof(key)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
@@ -1,45 +1,226 @@
 ﻿"""
 Question-Answering System for Member Data
 """
+import asyncio
+import bisect
+import json
 import os
-import sys
+import re
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 import requests
-from typing import Optional
-from fastapi import FastAPI, HTTPException
+from typing import List, Optional
+from fastapi import FastAPI, HTTPException, Response
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from dotenv import load_dotenv
 
-try:
-    from transformers import pipeline
-    TRANSFORMERS_AVAILABLE = True
-except ImportError:
-    TRANSFORMERS_AVAILABLE = False
+# Only local development uses a .env file; skip importing dotenv everywhere else.
+# Loaded before the project modules, some of which read settings at import.
+if os.path.exists(".env") or os.path.exists(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".env")):
+    from dotenv import load_dotenv
+    load_dotenv()
 
-load_dotenv()
+from answer_cache import AnswerCache, normalize_question
+from batching import MicroBatcher
+from fact_index import match_question
+from hf_client import CircuitBreaker, HFInferenceClient
+from message_cache import MessageCache
+from message_index import MessageIndex, query_terms, tokenize
+from message_store import MessageStore
+from messages_api import MESSAGES_API_URL, iter_messages
+from metrics import Metrics
+from qa_model import QA_MODEL_NAME, ModelLoader, pipeline_windows, tokenize_lines
+from semantic_index import Embedder, load_or_build, reciprocal_rank_fusion
+from temporal_index import epoch_date
 
 app = FastAPI(title="Member QA System", version="1.0.0")
 
 # Configuration
-MESSAGES_API_URL = "https://november7-730026606190.europe-west1.run.app/messages"
 HF_API_KEY = os.getenv("HF_API_KEY")
+# Number of top-ranked messages considered when building a context
+CONTEXT_TOP_K = int(os.getenv("CONTEXT_TOP_K", "20"))
+# Model tokens of message lines packed into a QA context; 0 = whatever fits one model window
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "0"))
+# Opt-in: run the local model over all of a named member's messages, chunked, before the top-k context
+WHOLE_HISTORY_QA = os.getenv("WHOLE_HISTORY_QA", "0") == "1"
+# Most chunks one question may run, and the span score that stops early (0 = run them all;
+# no default until a threshold is validated against pipeline-equivalent scores)
+WHOLE_HISTORY_MAX_CHUNKS = int(os.getenv("WHOLE_HISTORY_MAX_CHUNKS", "32"))
+WHOLE_HISTORY_MIN_SCORE = float(os.getenv("WHOLE_HISTORY_MIN_SCORE", "0"))
+# Dense retrieval with sentence embeddings alongside BM25 (needs sentence-transformers)
+SEMANTIC_RETRIEVAL = os.getenv("SEMANTIC_RETRIEVAL", "0") == "1"
+# Store message embeddings as int8 instead of float32 (4x smaller)
+EMBEDDING_QUANTIZE = os.getenv("EMBEDDING_QUANTIZE", "0") == "1"
+# Seconds before the messages snapshot is refreshed in the background (0 = never)
+MESSAGES_CACHE_TTL = float(os.getenv("MESSAGES_CACHE_TTL", "300"))
+# Messages requested per page when streaming the dataset from the API
+MESSAGES_PAGE_SIZE = int(os.getenv("MESSAGES_PAGE_SIZE", "500"))
+# Memory-mapped snapshot of the messages and their indexes, reused across restarts (empty = off)
+SNAPSHOT_FILE = os.getenv(
+    "SNAPSHOT_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".snapshots", "messages.snap")
+)
+# Prebuilt snapshot shipped with a deployment (see build_snapshot.py), used until SNAPSHOT_FILE exists
+SNAPSHOT_BUNDLE = os.getenv(
+    "SNAPSHOT_BUNDLE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "messages.snap")
+)
+# Threads available for local model inference (bounds concurrent pipeline calls)
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "2"))
+# Largest /ask/batch request, and how many of its questions are answered concurrently
+ASK_BATCH_MAX_QUESTIONS = int(os.getenv("ASK_BATCH_MAX_QUESTIONS", "1000"))
+ASK_BATCH_CONCURRENCY = int(os.getenv("ASK_BATCH_CONCURRENCY", "32"))
+# Answer cache: entries, seconds an answer stays valid, approximate memory bound
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1024"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "600"))
+ANSWER_CACHE_MAX_BYTES = int(os.getenv("ANSWER_CACHE_MAX_BYTES", str(4 * 1024 * 1024)))
+# HuggingFace Inference API: per-attempt timeout, total budget per question,
+# delay before hedging to the next endpoint (0 = off) and circuit breaker settings
+HF_ATTEMPT_TIMEOUT = float(os.getenv("HF_ATTEMPT_TIMEOUT", "5"))
+HF_REQUEST_BUDGET = float(os.getenv("HF_REQUEST_BUDGET", "12"))
+HF_HEDGE_DELAY = float(os.getenv("HF_HEDGE_DELAY", "2"))
+HF_BREAKER_THRESHOLD = int(os.getenv("HF_BREAKER_THRESHOLD", "3"))
+HF_BREAKER_RESET = float(os.getenv("HF_BREAKER_RESET", "30"))
+# Local model backend: pytorch, onnx or onnx-int8 (falls back to pytorch)
+QA_BACKEND = os.getenv("QA_BACKEND", "pytorch")
+# Set to 0 to never load a local model (serverless); answers then come from the Inference API or the fallback
+LOCAL_MODEL = os.getenv("LOCAL_MODEL", "1") == "1"
+# Intra-op threads per inference call (unset = library default)
+INFERENCE_THREADS = int(os.getenv("INFERENCE_THREADS", "0")) or None
+# Micro-batching of local pipeline calls: largest batch and how long to wait for one to fill
+QA_BATCH_MAX_SIZE = int(os.getenv("QA_BATCH_MAX_SIZE", "8"))
+QA_BATCH_WINDOW_MS = float(os.getenv("QA_BATCH_WINDOW_MS", "5"))
+# Set to 0 to turn off /metrics and the per-stage timers on the request path
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
 # Note: HF_API_KEY will be checked when needed, not at import time for Vercel compatibility
 # This allows the app to import even if the key is not set (will fail gracefully later)
 
-# Initialize QA pipeline if transformers is available
-qa_pipeline = None
-if TRANSFORMERS_AVAILABLE:
-    try:
-        qa_pipeline = pipeline(
-            "question-answering",
-            model="deepset/roberta-base-squad2",
-            tokenizer="deepset/roberta-base-squad2"
+# Prometheus metrics (no-ops when disabled)
+_metrics = Metrics(enabled=METRICS_ENABLED, prefix="qa_")
+_stage_seconds = _metrics.histogram(
+    "stage_seconds", "Time spent in each stage of answering a question", ("stage",)
+)
+_request_seconds = _metrics.histogram("request_seconds", "End-to-end request latency", ("endpoint",))
+_answers_total = _metrics.counter("answers_total", "Answers by the path that produced them", ("path",))
+_context_messages = _metrics.histogram(
+    "context_messages", "Messages included in a QA context", buckets=(0, 1, 2, 5, 10, 15, 20, 30, 50, 100)
+)
+_context_chars = _metrics.histogram(
+    "context_chars", "Characters in a QA context", buckets=(0, 250, 500, 1000, 2000, 3000, 4000, 5000, 7500, 10000)
+)
+_context_tokens = _metrics.histogram(
+    "context_tokens", "Model tokens in a QA context", buckets=(0, 64, 128, 256, 384, 444, 512, 768, 1024, 1536, 2048)
+)
+_inference_windows = _metrics.histogram(
+    "inference_windows", "Model windows run to answer one question locally", buckets=(1, 2, 3, 4, 6, 8, 12, 16)
+)
+_hf_attempt_seconds = _metrics.histogram(
+    "hf_attempt_seconds", "Latency of each HuggingFace Inference API attempt", ("outcome",)
+)
+_messages_load_seconds = _metrics.histogram(
+    "messages_load_seconds", "Time to fetch and index a messages snapshot", ("source",)
+)
+
+# The QA pipeline loads and warms up in the background; until it is ready
+# questions are answered by the keyword fallback
+_qa_model = ModelLoader(QA_BACKEND, INFERENCE_THREADS, warmup_batch_size=QA_BATCH_MAX_SIZE, enabled=LOCAL_MODEL)
+
+# Index for message lists that don't come from the cache
+_message_index = None
+_message_index_source = None
+
+# CPU-bound pipeline calls run here so they never block the event loop
+_inference_executor = ThreadPoolExecutor(max_workers=INFERENCE_WORKERS, thread_name_prefix="qa-inference")
+
+
+def run_qa_batch(items: list) -> list:
+    """
+    Run (question, context, context_ids) items through the local model as
+    padded batches. Items with pre-tokenized context ids that fit one window
+    go straight to the model; the rest go through the pipeline, which
+    tokenizes the context itself. Each result records the model windows it
+    took ("windows", None if unknown).
+    """
+    results = [None] * len(items)
+    runner = _qa_model.runner
+    
+    direct = []
+    if runner is not None:
+        # Contexts longer than one window go to the pipeline, which splits them
+        budget = runner.context_budget(runner.max_question_len)
+        direct = [i for i, item in enumerate(items) if item[2] is not None and len(item[2]) <= budget]
+    if direct:
+        outputs = runner.answer_batch([items[i][0] for i in direct], [items[i][2] for i in direct])
+        for i, output in zip(direct, outputs):
+            output["windows"] = 1
+            results[i] = output
+    
+    rest = [i for i in range(len(items)) if results[i] is None]
+    if rest:
+        outputs = _qa_model.pipeline(
+            question=[items[i][0] for i in rest],
+            context=[items[i][1] for i in rest],
+            batch_size=len(rest)
         )
-    except Exception as e:
-        print(f"Warning: Could not load QA pipeline: {e}")
-        qa_pipeline = None
+        # The pipeline unwraps single-item batches
+        if isinstance(outputs, dict):
+            outputs = [outputs]
+        tokenizer = _qa_model.tokenizer
+        for i, output in zip(rest, outputs):
+            question, _, context_ids = items[i]
+            output["windows"] = None
+            if context_ids is not None and tokenizer is not None:
+                question_len = len(tokenizer(question, add_special_tokens=False)["input_ids"])
+                output["windows"] = pipeline_windows(question_len, len(context_ids))
+            results[i] = output
+    return results
+
+
+def context_token_budget() -> Optional[int]:
+    """Token budget for packing contexts: configured, else one window of the local model, else None."""
+    if CONTEXT_TOKEN_BUDGET > 0:
+        return CONTEXT_TOKEN_BUDGET
+    runner = _qa_model.runner
+    if runner is not None:
+        return runner.context_budget(runner.max_question_len)
+    return None
 
-# Cache for messages data
-_messages_cache = None
+
+_embedder = Embedder() if SEMANTIC_RETRIEVAL else None
+
+
+def embed_snapshot(snapshot):
+    """Attach a dense retrieval index to a snapshot, loading saved embeddings when possible."""
+    if _embedder is not None and snapshot.index.semantic is None:
+        snapshot.index.semantic = load_or_build(
+            _embedder, snapshot.messages.texts, snapshot.version, quantize=EMBEDDING_QUANTIZE
+        )
+
+
+def tokenize_snapshot(snapshot):
+    """Cache model token ids for every context line of a snapshot, once a tokenizer is loaded."""
+    store = snapshot.messages
+    tokenizer = _qa_model.tokenizer
+    if tokenizer is not None and store.line_token_ids is None:
+        store.line_token_ids = tokenize_lines(tokenizer, store.lines)
+
+
+_qa_batcher = MicroBatcher(
+    run_qa_batch,
+    _inference_executor,
+    max_batch_size=QA_BATCH_MAX_SIZE,
+    max_wait_ms=QA_BATCH_WINDOW_MS
+)
+
+# Shared connection pools for upstream calls
+_upstream_session = requests.Session()
+_hf_client = HFInferenceClient(
+    HF_API_KEY,
+    attempt_timeout=HF_ATTEMPT_TIMEOUT,
+    request_budget=HF_REQUEST_BUDGET,
+    hedge_delay=HF_HEDGE_DELAY,
+    breaker=CircuitBreaker(HF_BREAKER_THRESHOLD, reset_timeout=HF_BREAKER_RESET),
+    observe_attempt=lambda outcome, seconds: _hf_attempt_seconds.observe(seconds, outcome=outcome)
+)
 
 
 class QuestionRequest(BaseModel):
@@ -50,180 +231,498 @@ class AnswerResponse(BaseModel):
     answer: str
 
 
-def fetch_all_messages():
-    """Fetch all messages from the API."""
-    global _messages_cache
-    
-    if _messages_cache is not None:
-        return _messages_cache
-    
+class BatchQuestionRequest(BaseModel):
+    questions: List[str]
+
+
+class BatchAnswerItem(BaseModel):
+    question: str
+    answer: Optional[str] = None
+    error: Optional[str] = None
+
+
+class BatchAnswerResponse(BaseModel):
+    answers: List[BatchAnswerItem]
+
+
+def load_messages_from_api():
+    """Stream all messages from the upstream API, page by page."""
+    return iter_messages(MESSAGES_API_URL, page_size=MESSAGES_PAGE_SIZE, timeout=30, session=_upstream_session)
+
+
+# Cache for messages data and the indexes built over it
+_messages_cache = MessageCache(
+    load_messages_from_api,
+    ttl=MESSAGES_CACHE_TTL,
+    snapshot_path=SNAPSHOT_FILE or None,
+    tokenizer_name=QA_MODEL_NAME,
+    bundle_path=SNAPSHOT_BUNDLE or None
+)
+_messages_cache.add_snapshot_hook(tokenize_snapshot)
+_messages_cache.add_snapshot_hook(embed_snapshot)
+_messages_cache.add_snapshot_hook(
+    lambda snapshot: _messages_load_seconds.observe(snapshot.load_seconds, source=snapshot.source)
+)
+
+
+def _tokenize_current_snapshot(model):
+    snapshot = _messages_cache.snapshot
+    if snapshot is not None:
+        tokenize_snapshot(snapshot)
+        _messages_cache.save_file(snapshot)
+
+
+# Snapshots loaded before the model was ready get tokenized when it is
+_qa_model.on_ready(_tokenize_current_snapshot)
+
+
+# How many local model windows each locally answered question took
+_windows_used = Counter()
+
+# Answers keyed on the normalized question and the snapshot they came from
+_answer_cache = AnswerCache(ANSWER_CACHE_SIZE, ttl=ANSWER_CACHE_TTL, max_bytes=ANSWER_CACHE_MAX_BYTES)
+
+
+def _snapshot_gauge(value):
+    """Collector for a value of the current messages snapshot (no sample before the first load)."""
+    def collect():
+        snapshot = _messages_cache.snapshot
+        return [] if snapshot is None else [({}, value(snapshot))]
+    return collect
+
+
+# Counters that already exist elsewhere are read at scrape time
+_metrics.add_collector(
+    "answer_cache_lookups_total", "counter", "Answer cache lookups by result",
+    lambda: [({"result": "hit"}, _answer_cache.hits), ({"result": "miss"}, _answer_cache.misses)]
+)
+_metrics.add_collector(
+    "answer_cache_entries", "gauge", "Answers currently cached", lambda: [({}, _answer_cache.stats()["entries"])]
+)
+_metrics.add_collector(
+    "messages", "gauge", "Messages in the current snapshot", _snapshot_gauge(lambda snapshot: len(snapshot.messages))
+)
+_metrics.add_collector(
+    "messages_snapshot_age_seconds", "gauge", "Age of the current messages snapshot",
+    _snapshot_gauge(lambda snapshot: snapshot.age)
+)
+_metrics.add_collector(
+    "model_ready", "gauge", "1 once the local QA model is loaded and warmed up",
+    lambda: [({}, 1 if _qa_model.is_ready else 0)]
+)
+_metrics.add_collector(
+    "hf_breaker_open", "gauge", "1 while the Inference API circuit breaker is open",
+    lambda: [({}, 1 if _hf_client.breaker.state == "open" else 0)]
+)
+# Local model micro-batching (the same numbers as the "batching" section of /stats)
+_metrics.add_collector(
+    "batches_total", "counter", "Local model batches run, by outcome",
+    lambda: [({"result": "ok"}, _qa_batcher.batches_run - _qa_batcher.failed_batches),
+             ({"result": "failed"}, _qa_batcher.failed_batches)]
+)
+_metrics.add_collector(
+    "batch_items_total", "counter", "Questions run through local model batches",
+    lambda: [({}, _qa_batcher.items_run)]
+)
+_metrics.add_collector(
+    "full_batches_total", "counter", "Batches flushed because they reached the maximum size",
+    lambda: [({}, _qa_batcher.full_batches)]
+)
+_metrics.add_collector(
+    "batch_seconds_total", "counter", "Time spent running local model batches",
+    lambda: [({}, _qa_batcher.batch_seconds_total)]
+)
+_metrics.add_collector(
+    "batch_mean_size", "gauge", "Mean questions per local model batch",
+    lambda: [({}, _qa_batcher.stats()["mean_batch_size"])]
+)
+_metrics.add_collector(
+    "batch_queued", "gauge", "Questions waiting for the next batch", lambda: [({}, _qa_batcher.stats()["queued"])]
+)
+_metrics.add_collector(
+    "batch_config", "gauge", "Batching settings: maximum batch size and collection window in seconds",
+    lambda: [({"setting": "max_batch_size"}, _qa_batcher.max_batch_size),
+             ({"setting": "window_seconds"}, _qa_batcher.max_wait_ms / 1000.0)]
+)
+
+
+def fetch_messages_snapshot():
+    """
+    Return the current messages snapshot, loading it if the cache is cold.
+    Concurrent cold-cache callers share a single upstream request.
+    """
     try:
-        response = requests.get(MESSAGES_API_URL, timeout=30)
-        response.raise_for_status()
-        data = response.json()
-        _messages_cache = data.get("items", [])
-        return _messages_cache
+        return _messages_cache.get()
     except requests.RequestException as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch messages: {str(e)}")
 
 
-def build_context_for_question(question: str, messages: list, max_context_length: int = 5000) -> str:
+async def fetch_messages_snapshot_async():
+    """Like fetch_messages_snapshot, but waits for a cold-cache load off the event loop."""
+    with _stage_seconds.time(stage="fetch"):
+        if _messages_cache.snapshot is None:
+            return await run_in_threadpool(fetch_messages_snapshot)
+        return fetch_messages_snapshot()
+
+
+def fetch_all_messages():
+    """Fetch all messages, serving the cached snapshot when one is loaded."""
+    return fetch_messages_snapshot().messages
+
+
+def get_message_index(messages) -> MessageIndex:
     """
-    Build a context string from messages that are relevant to the question.
-    Uses simple keyword matching to filter relevant messages.
+    Return the index for the given messages (a MessageStore or a list of
+    message dicts), building it if it isn't cached.
     """
-    question_lower = question.lower()
-    question_words = set(question_lower.split())
+    global _message_index, _message_index_source
     
-    # Extract potential entity names (capitalized words)
-    potential_names = [word for word in question.split() if word[0].isupper()]
+    snapshot = _messages_cache.snapshot
+    if snapshot is not None and snapshot.messages is messages:
+        return snapshot.index
+    if _message_index is None or _message_index_source is not messages:
+        store = messages if isinstance(messages, MessageStore) else MessageStore.from_messages(messages)
+        _message_index = MessageIndex(store)
+        _message_index_source = messages
+    return _message_index
+
+
+def select_context_messages(question: str, messages, max_context_length: int = 5000,
+                            top_k: int = CONTEXT_TOP_K, query_vector=None, token_budget: int = None) -> tuple:
+    """
+    Pick the messages relevant to the question, returning (store, message ids).
+    Messages are ranked with BM25 over the question's non-stopword terms;
+    messages written by a member named in the question rank first. With a
+    query embedding and a semantic index, nearest-neighbour messages are
+    fused into the ranking, which also catches paraphrases BM25 misses.
     
-    relevant_messages = []
+    With a token_budget and a tokenized store, the best-ranked lines are
+    packed into that many model tokens; otherwise the context is capped at
+    max_context_length characters.
+    """
+    index = get_message_index(messages)
+    lines = index.store.lines
     
-    for msg in messages:
-        msg_text = msg.get("message", "").lower()
-        user_name = msg.get("user_name", "").lower()
-        
-        # Check if message is relevant
-        is_relevant = False
-        
-        # Check for name matches
-        for name in potential_names:
-            if name.lower() in user_name:
-                is_relevant = True
-                break
-        
-        # Check for keyword matches
-        if not is_relevant:
-            msg_words = set(msg_text.split())
-            if question_words.intersection(msg_words):
-                is_relevant = True
-        
-        if is_relevant:
-            relevant_messages.append(msg)
+    name_ids = index.ids_for_question(question)
+    ranked_ids = index.top_k(query_terms(question), top_k, preferred_ids=name_ids)
+    
+    if index.semantic is not None and query_vector is not None:
+        # Restrict neighbours to the named member's messages when there is one
+        row_ids = sorted(name_ids) if name_ids else None
+        dense_ids = index.semantic.search(query_vector, top_k, row_ids=row_ids)[0]
+        ranked_ids = reciprocal_rank_fusion(ranked_ids, dense_ids)
+        if name_ids:
+            ranked_ids.sort(key=lambda msg_id: msg_id not in name_ids)
+        ranked_ids = ranked_ids[:top_k]
     
     # If no relevant messages found, use all messages (fallback)
-    if not relevant_messages:
-        relevant_messages = messages
+    if not ranked_ids:
+        ranked_ids = range(min(top_k, len(lines)))
+    
+    selected = []
+    column = index.store.line_token_ids if token_budget else None
+    if column is not None:
+        # Skip lines that don't fit instead of stopping, so one long message
+        # doesn't crowd out shorter relevant ones ranked after it
+        used = 0
+        for msg_id in ranked_ids:
+            length = column.length(msg_id)
+            if used + length <= token_budget:
+                selected.append(msg_id)
+                used += length
+        return index.store, selected
     
-    # Build context string
-    context_parts = []
     current_length = 0
     
-    for msg in relevant_messages[:100]:  # Limit to top 100 relevant messages
-        msg_str = f"{msg.get('user_name', 'Unknown')}: {msg.get('message', '')} (Date: {msg.get('timestamp', '')[:10]})\n"
-        if current_length + len(msg_str) > max_context_length:
+    for msg_id in ranked_ids:
+        line_length = len(lines[msg_id])
+        if current_length + line_length > max_context_length:
             break
-        context_parts.append(msg_str)
-        current_length += len(msg_str)
+        selected.append(msg_id)
+        current_length += line_length
+    
+    return index.store, selected
+
+
+def build_context_for_question(question: str, messages, max_context_length: int = 5000,
+                               top_k: int = CONTEXT_TOP_K) -> str:
+    """
+    Build a context string from messages that are relevant to the question.
+    Uses the precomputed line of each selected message.
+    """
+    store, selected = select_context_messages(question, messages, max_context_length, top_k)
+    return "\n".join(store.lines[msg_id] for msg_id in selected)
+
+
+def build_context_token_ids(store, selected: list) -> Optional[list]:
+    """Model token ids for the selected messages' lines, or None if the store isn't tokenized."""
+    column = store.line_token_ids
+    if column is None:
+        return None
+    context_ids = []
+    for msg_id in selected:
+        context_ids.extend(column[msg_id])
+    return context_ids
+
+
+def history_chunks(question: str, index: MessageIndex, token_budget: int, max_chunks: int) -> list:
+    """
+    All messages of the members named in the question, packed into chunks of
+    at most token_budget tokens. Messages matching the question's terms come
+    first (best BM25 score first), then the rest, newest first, so early
+    chunks are the most promising. Returns at most max_chunks token id lists.
+    """
+    column = index.store.line_token_ids
+    member_ids = index.ids_for_question(question)
+    if column is None or not member_ids:
+        return []
+    
+    scores = index.bm25_scores(query_terms(question))
+    epochs = index.store.epochs
+    ordered = sorted(member_ids, key=lambda msg_id: (-scores.get(msg_id, 0.0), -epochs[msg_id], msg_id))
+    
+    chunks, chunk = [], []
+    for msg_id in ordered:
+        ids = column[msg_id]
+        if chunk and len(chunk) + len(ids) > token_budget:
+            chunks.append(chunk)
+            if len(chunks) == max_chunks:
+                return chunks
+            chunk = []
+        chunk.extend(ids)
+    if chunk:
+        chunks.append(chunk)
+    return chunks[:max_chunks]
+
+
+async def answer_whole_history(question: str, snapshot) -> Optional[dict]:
+    """
+    Answer from every chunk of the named member's history in batched local
+    inference (see history_chunks), keeping the best span across chunks.
+    Latency is bounded by WHOLE_HISTORY_MAX_CHUNKS, and by an early stop
+    once a span clears WHOLE_HISTORY_MIN_SCORE if one is set. None when the
+    mode is off, HF_API_KEY is unset (model paths are off, as in
+    answer_question_detailed), the model or token cache isn't ready, no
+    member is named or no span clears the same confidence bar as the
+    pipeline path.
+    """
+    runner = _qa_model.runner
+    # Same gate as answer_question_detailed: without an API key only the keyword fallback answers
+    if not WHOLE_HISTORY_QA or not HF_API_KEY or runner is None or snapshot.messages.line_token_ids is None:
+        return None
+    chunks = history_chunks(
+        question, snapshot.index, runner.context_budget(runner.max_question_len), WHOLE_HISTORY_MAX_CHUNKS
+    )
+    if not chunks:
+        return None
+    
+    loop = asyncio.get_running_loop()
+    with _stage_seconds.time(stage="history"):
+        result = await loop.run_in_executor(
+            _inference_executor, runner.answer_chunks, question, chunks, QA_BATCH_MAX_SIZE,
+            WHOLE_HISTORY_MIN_SCORE or None
+        )
+    _inference_windows.observe(result["windows"])
+    _windows_used[result["windows"]] += 1
+    if not result["answer"] or result["score"] <= 0.1:
+        return None
+    return {"answer": result["answer"], "score": result["score"], "source": "history", "windows": result["windows"]}
+
+
+def answer_from_facts(question: str, snapshot) -> Optional[dict]:
+    """
+    Answer a count, favorite or location question ("How many cars does
+    Vikram Desai have?") with a lookup in the snapshot's fact tables. None,
+    leaving the question to retrieval, when it fits no template, doesn't name
+    exactly one member unambiguously (see NameMatches.unique) or the member
+    never stated that fact.
+    """
+    wanted = match_question(question)
+    if wanted is None:
+        return None
+    user_key = snapshot.index.names.match(question).unique
+    if user_key is None:
+        return None
+    fact = snapshot.facts.get(user_key, *wanted)
+    if fact is None:
+        return None
+    value, msg_id = fact
+    store = snapshot.messages
+    answer = f'{store.user_names[msg_id]}: {value}. From the message: "{store.texts[msg_id]}"'
+    return {"answer": answer, "score": None, "source": "facts", "windows": 0}
+
+
+# Questions asking for a date, answered from the members' timelines
+_TIMELINE_QUESTION_RE = re.compile(r"^\s*when\b|\b(?:what|which) (?:date|day)\b", re.IGNORECASE)
+# Question words that describe the date itself rather than the event
+_TIMELINE_IGNORED_TERMS = frozenset({"date", "day", "time", "exactly"})
+
+
+def format_day(day) -> str:
+    """A date as "Friday, March 14, 2025"."""
+    return f"{day:%A}, {day:%B} {day.day}, {day.year}"
+
+
+def answer_from_timeline(question: str, snapshot) -> Optional[dict]:
+    """
+    Answer a "when" question from the temporal index without the model: among
+    the dates the named member mentioned, take the one whose message best
+    matches the rest of the question (IDF-weighted term overlap, checked by
+    bisecting the terms' sorted posting ids; ties to the newest message).
+    None, leaving the question to retrieval, for other questions, when it
+    doesn't name exactly one member unambiguously (see NameMatches.unique) or
+    no dated message shares a term with the question.
+    """
+    if not _TIMELINE_QUESTION_RE.search(question):
+        return None
+    index = snapshot.index
+    user_key = index.names.match(question).unique
+    if user_key is None:
+        return None
+    
+    with _stage_seconds.time(stage="timeline"):
+        name_tokens = set(tokenize(index.user_names[user_key]))
+        # (idf, ids of the messages containing the term, ascending)
+        postings = [
+            (index.idf[term], index.postings.get(term)[0]) for term in query_terms(question)
+            if term not in name_tokens and term not in _TIMELINE_IGNORED_TERMS and index.postings.get(term)
+        ]
+        if not postings:
+            return None
+        
+        store = index.store
+        best, best_key = None, (0.0,)
+        for day, msg_id, expression in index.timeline.entries(user_key):
+            score = 0.0
+            for idf, ids in postings:
+                i = bisect.bisect_left(ids, msg_id)
+                if i < len(ids) and ids[i] == msg_id:
+                    score += idf
+            key = (score, store.epochs[msg_id], day)
+            if score > 0 and key > best_key:
+                best, best_key = (day, msg_id, expression), key
+    if best is None:
+        return None
     
-    return "\n".join(context_parts)
+    day, msg_id, expression = best
+    sent = epoch_date(store.epochs[msg_id])
+    said = f'"{expression}", said on {sent.isoformat()}' if sent is not None else f'"{expression}"'
+    answer = f'{store.user_names[msg_id]}: {format_day(day)} ({said}). From the message: "{store.texts[msg_id]}"'
+    return {"answer": answer, "score": None, "source": "timeline", "windows": 0}
 
 
-def answer_question_with_hf(question: str, context: str) -> str:
+def prepare_context(question: str, messages, query_vector=None) -> tuple:
+    """The context string for a question and, when cached, its token ids."""
+    store, selected = select_context_messages(
+        question, messages, query_vector=query_vector, token_budget=context_token_budget()
+    )
+    context = "\n".join(store.lines[msg_id] for msg_id in selected)
+    context_ids = build_context_token_ids(store, selected)
+    _context_messages.observe(len(selected))
+    _context_chars.observe(len(context))
+    if context_ids is not None:
+        _context_tokens.observe(len(context_ids))
+    return context, context_ids
+
+
+async def prepare_context_async(question: str, snapshot) -> tuple:
+    """
+    prepare_context for a snapshot, run in the threadpool: BM25 scoring and
+    embedding the question are CPU work that would otherwise block the event
+    loop for every other request.
+    """
+    with _stage_seconds.time(stage="context"):
+        if _embedder is None or snapshot.index.semantic is None:
+            return await run_in_threadpool(prepare_context, question, snapshot.messages)
+        query_vector = (await run_in_threadpool(_embedder.encode, [question]))[0]
+        return await run_in_threadpool(prepare_context, question, snapshot.messages, query_vector)
+
+
+async def answer_question_with_hf(question: str, context: str, context_ids: list = None) -> str:
     """Use HuggingFace to answer the question based on context."""
+    result = await answer_question_detailed(question, context, context_ids)
+    return result["answer"]
+
+
+async def answer_question_detailed(question: str, context: str, context_ids: list = None) -> dict:
+    """
+    Answer like answer_question_with_hf, also reporting the model score (None
+    when no model was involved), which path produced the answer (pipeline,
+    low_confidence, remote or simple) and how many local model windows were
+    run ("windows": 0 if the local model wasn't used, None if unknown). With
+    context_ids (the context already tokenized) the local model skips
+    tokenizing the context.
+    """
     # Check API key
     if not HF_API_KEY:
-        return answer_question_simple(question, context)
+        return _answer_simple_timed(question, context)
+    # Until the local model is hot, answer with the keyword fallback rather
+    # than spending the remote request budget on every question
+    if _qa_model.is_pending:
+        return _answer_simple_timed(question, context)
     
+    windows = 0
     # Try using local transformers pipeline first (faster, no API calls)
-    if qa_pipeline is not None:
+    if _qa_model.is_ready:
         try:
-            result = qa_pipeline(question=question, context=context)
+            with _stage_seconds.time(stage="pipeline"):
+                result = await _qa_batcher.submit((question, context, context_ids))
+            windows = result.get("windows")
+            _windows_used[windows if windows is not None else "unknown"] += 1
+            if windows is not None:
+                _inference_windows.observe(windows)
             answer = result.get("answer", "")
             score = result.get("score", 0)
             
             if answer and score > 0.1:
-                return answer
+                return {"answer": answer, "score": score, "source": "pipeline", "windows": windows}
             elif answer:
-                return f"I found some information, but the confidence is low: {answer}"
+                return {
+                    "answer": f"I found some information, but the confidence is low: {answer}",
+                    "score": score,
+                    "source": "low_confidence",
+                    "windows": windows
+                }
         except Exception as e:
             print(f"Pipeline error: {e}, falling back to API")
     
-    # Use HuggingFace Inference API
+    # Use HuggingFace Inference API (short-circuits while the breaker is open)
     try:
-        headers = {
-            "Authorization": f"Bearer {HF_API_KEY}",
-            "Content-Type": "application/json"
-        }
-        
-        # Try multiple API endpoint formats
-        api_urls = [
-            "https://api-inference.huggingface.co/models/deepset/roberta-base-squad2",
-            f"https://api-inference.huggingface.co/pipeline/question-answering/deepset/roberta-base-squad2"
-        ]
-        
-        for api_url in api_urls:
-            try:
-                # Try direct format first
-                payload = {
-                    "question": question,
-                    "context": context
-                }
-                
-                response = requests.post(api_url, headers=headers, json=payload, timeout=30)
-                
-                if response.status_code == 200:
-                    result = response.json()
-                    if isinstance(result, dict):
-                        if "answer" in result:
-                            answer = result["answer"]
-                            score = result.get("score", 1.0)
-                            if answer and len(answer.strip()) > 0:
-                                if score > 0.05:  # Lower threshold
-                                    return answer
-                                else:
-                                    # Low confidence but return anyway
-                                    return answer
-                        elif "error" not in result:
-                            # Try to extract answer from response
-                            if "text" in result:
-                                return result["text"]
-                elif response.status_code == 503:
-                    # Model is loading, will fall back to simple method
-                    print("HF model is loading, using fallback", file=sys.stderr)
-                
-                # Try with inputs wrapper
-                payload = {
-                    "inputs": {
-                        "question": question,
-                        "context": context
-                    }
-                }
-                
-                response = requests.post(api_url, headers=headers, json=payload, timeout=30)
-                
-                if response.status_code == 200:
-                    result = response.json()
-                    if isinstance(result, dict) and "answer" in result:
-                        return result["answer"]
-                    elif isinstance(result, list) and len(result) > 0:
-                        if isinstance(result[0], dict) and "answer" in result[0]:
-                            return result[0]["answer"]
-            except Exception as e:
-                continue
-                
+        with _stage_seconds.time(stage="remote"):
+            result = await _hf_client.answer(question, context)
+        if result is not None:
+            return {"answer": result["answer"], "score": result["score"], "source": "remote", "windows": windows}
     except Exception as e:
         print(f"API error: {e}")
     
     # Final fallback to simple method
-    return answer_question_simple(question, context)
+    return _answer_simple_timed(question, context, windows)
+
+
+def _answer_simple_timed(question: str, context: str, windows: int = 0) -> dict:
+    with _stage_seconds.time(stage="simple"):
+        answer = answer_question_simple(question, context)
+    return {"answer": answer, "score": None, "source": "simple", "windows": windows}
+
 
+def question_member_names(question: str) -> list:
+    """Lowercased names of the members the question mentions, resolved against the current snapshot."""
+    snapshot = _messages_cache.snapshot
+    if snapshot is None:
+        return []
+    return snapshot.index.names.names(question)
 
-def answer_question_simple(question: str, context: str) -> str:
-    """Simple fallback answer extraction using keyword matching."""
+
+def answer_question_simple(question: str, context: str, member_names: list = None) -> str:
+    """
+    Simple fallback answer extraction using keyword matching. member_names
+    (lowercased) default to the members the question names.
+    """
     question_lower = question.lower()
     lines = context.split("\n")
     
-    # Extract member name from question
-    question_words = question.split()
-    member_name = None
-    for word in question_words:
-        if word[0].isupper() and len(word) > 2:
-            # Check if it's a name (not a location)
-            if word.lower() not in ["london", "paris", "tokyo", "dubai", "milan", "monaco", "new", "york", "san", "francisco", "when", "what", "where", "how", "who"]:
-                member_name = word
-                break
+    if member_names is None:
+        member_names = question_member_names(question)
     
     # Find relevant lines
     relevant_lines = []
@@ -232,7 +731,7 @@ def answer_question_simple(question: str, context: str) -> str:
             continue
         line_lower = line.lower()
         # Check if line mentions the member
-        if member_name and member_name.lower() in line_lower:
+        if any(name in line_lower for name in member_names):
             relevant_lines.append(line)
         # Check for keyword matches
         elif any(word in line_lower for word in question_lower.split() if len(word) > 3):
@@ -316,6 +815,129 @@ def answer_question_simple(question: str, context: str) -> str:
     return "I found relevant information in the messages, but couldn't extract a specific answer. Please check the member messages for details."
 
 
+def cache_answer(cache_key, result: dict):
+    """
+    Cache an answer result. Keyword-fallback answers are skipped when the
+    Inference API is configured: they only stand in for a failed remote call
+    or an open breaker, and caching them would outlast the outage.
+    """
+    if result["source"] == "simple" and HF_API_KEY:
+        return
+    _answer_cache.put(cache_key, result["answer"])
+
+
+async def answer_from_snapshot(question: str, snapshot) -> str:
+    """Answer one question against a messages snapshot, using the answer cache."""
+    result = await answer_from_snapshot_detailed(question, snapshot)
+    return result["answer"]
+
+
+async def answer_from_snapshot_detailed(question: str, snapshot) -> dict:
+    """
+    Like answer_from_snapshot, returning {"answer", "score", "source",
+    "windows"} where source is the answer path (facts, timeline, history,
+    pipeline, low_confidence, remote, simple), cache or none.
+    """
+    result = None
+    async for event, data in answer_stages(question, snapshot):
+        if event == "final":
+            result = data
+    return result
+
+
+async def answer_stages(question: str, snapshot, candidate: bool = False):
+    """
+    The stages of answering one question against a snapshot, as (event,
+    data) pairs: optionally "context" (what was retrieved) and "candidate"
+    (the keyword fallback's answer, only with candidate=True), always ending
+    with "final", the answer dict. /ask keeps the final answer; /ask/stream
+    relays every stage. Counts the answer path and caches the answer.
+    """
+    if not snapshot.messages:
+        _answers_total.inc(path="none")
+        yield "final", {"answer": "No member messages are currently available.", "score": None,
+                        "source": "none", "windows": 0}
+        return
+    
+    # Answers from the keyword fallback are cached apart from model answers
+    cache_key = AnswerCache.make_key(question, snapshot.version, _qa_model.is_ready)
+    cached = _answer_cache.get(cache_key)
+    if cached is not None:
+        _answers_total.inc(path="cache")
+        yield "final", {"answer": cached, "score": None, "source": "cache", "windows": 0}
+        return
+    
+    result = answer_from_facts(question, snapshot) or answer_from_timeline(question, snapshot)
+    if result is None:
+        result = await answer_whole_history(question, snapshot)
+    if result is not None:
+        _answers_total.inc(path=result["source"])
+        cache_answer(cache_key, result)
+        yield "final", result
+        return
+    
+    context, context_ids = await prepare_context_async(question, snapshot)
+    yield "context", {
+        "messages": sum(1 for line in context.split("\n") if line.strip()),
+        "chars": len(context),
+        "tokens": len(context_ids) if context_ids is not None else None
+    }
+    if not context:
+        _answers_total.inc(path="none")
+        yield "final", {"answer": "I couldn't find any relevant information to answer your question.",
+                        "score": None, "source": "none", "windows": 0}
+        return
+    
+    if candidate:
+        # Cheap keyword answer first so clients can show something immediately
+        yield "candidate", {"answer": answer_question_simple(question, context), "source": "simple"}
+    
+    result = await answer_question_detailed(question, context, context_ids)
+    _answers_total.inc(path=result["source"])
+    cache_answer(cache_key, result)
+    yield "final", result
+
+
+def format_sse(event: str, data: dict) -> str:
+    """Encode one Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def stream_answer_events(question: str):
+    """
+    Yield SSE events for one question as each stage completes:
+    context -> candidate (keyword fallback) -> final (model) -> done.
+    A cached answer is sent straight away as the final event.
+    """
+    try:
+        async for event in _answer_stages(question):
+            yield event
+    except Exception as e:
+        yield format_sse("error", {"detail": f"Error processing question: {str(e)}"})
+    yield format_sse("done", {})
+
+
+async def _answer_stages(question: str):
+    """SSE events for each stage of answering one question."""
+    snapshot = await fetch_messages_snapshot_async()
+    async for event, data in answer_stages(question, snapshot, candidate=True):
+        yield format_sse(event, data)
+
+
+@app.on_event("startup")
+async def on_startup():
+    """Load the model and warm the messages cache in the background."""
+    _qa_model.start()
+    _messages_cache.start()
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    """Stop background refreshes and release upstream connections."""
+    _messages_cache.stop()
+    await _hf_client.aclose()
+
+
 @app.get("/")
 async def root():
     """Root endpoint."""
@@ -324,7 +946,12 @@ async def root():
         "version": "1.0.0",
         "endpoints": {
             "/ask": "POST - Ask a question about member data",
-            "/health": "GET - Health check"
+            "/ask/stream": "POST - Ask a question, streaming answers as Server-Sent Events",
+            "/ask/batch": "POST - Ask many questions at once",
+            "/health": "GET - Health check",
+            "/ready": "GET - Model and data readiness",
+            "/stats": "GET - Runtime counters",
+            "/metrics": "GET - Prometheus metrics"
         }
     }
 
@@ -335,8 +962,47 @@ async def health():
     return {"status": "healthy"}
 
 
+@app.get("/ready")
+async def ready():
+    """
+    Readiness of the QA model and messages cache, separate from liveness.
+    Returns 503 while the model is still loading or warming up.
+    """
+    model = _qa_model.status()
+    body = {
+        "status": model["state"],
+        "model": model,
+        "messages_loaded": _messages_cache.snapshot is not None
+    }
+    status_code = 503 if model["state"] in ("not_started", "loading", "warming") else 200
+    return JSONResponse(status_code=status_code, content=body)
+
+
+@app.get("/stats")
+async def stats():
+    """Runtime counters for tuning (model backend, caches, remote API, inference batching)."""
+    return {
+        "qa_model": _qa_model.status(),
+        "answer_cache": _answer_cache.stats(),
+        "hf_api": _hf_client.stats(),
+        "qa_batching": _qa_batcher.stats(),
+        "context": {
+            "token_budget": context_token_budget(),
+            "windows_used": {str(windows): count for windows, count in sorted(_windows_used.items(), key=str)}
+        }
+    }
+
+
+@app.get("/metrics")
+async def metrics():
+    """Latency histograms and counters in the Prometheus text format."""
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return PlainTextResponse(_metrics.render(), media_type="text/plain; version=0.0.4")
+
+
 @app.post("/ask", response_model=AnswerResponse)
-async def ask_question(request: QuestionRequest):
+async def ask_question(request: QuestionRequest, response: Response):
     """
     Answer a natural-language question about member data.
     
@@ -344,32 +1010,102 @@ async def ask_question(request: QuestionRequest):
     - "When is Layla planning her trip to London?"
     - "How many cars does Vikram Desai have?"
     - "What are Amira's favorite restaurants?"
+    
+    The X-Answer-Path response header tells which path produced the answer,
+    and X-Inference-Windows how many local model windows it took.
     """
     if not request.question or not request.question.strip():
         raise HTTPException(status_code=400, detail="Question cannot be empty")
     
+    # No-op once started; covers deployments that skip startup events
+    _qa_model.start()
+    
     try:
-        # Fetch messages
-        messages = fetch_all_messages()
-        
-        if not messages:
-            return AnswerResponse(answer="No member messages are currently available.")
-        
-        # Build context
-        context = build_context_for_question(request.question, messages)
-        
-        if not context:
-            return AnswerResponse(answer="I couldn't find any relevant information to answer your question.")
-        
-        # Get answer using HuggingFace API
-        answer = answer_question_with_hf(request.question, context)
-        
-        return AnswerResponse(answer=answer)
+        with _request_seconds.time(endpoint="/ask"):
+            # Fetch messages
+            snapshot = await fetch_messages_snapshot_async()
+            result = await answer_from_snapshot_detailed(request.question, snapshot)
+        response.headers["X-Answer-Path"] = result["source"]
+        if result["windows"] is not None:
+            response.headers["X-Inference-Windows"] = str(result["windows"])
+        return AnswerResponse(answer=result["answer"])
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing question: {str(e)}")
 
 
+@app.post("/ask/stream")
+async def ask_question_stream(request: QuestionRequest):
+    """
+    Streaming variant of /ask using Server-Sent Events.
+    
+    Emits `context` once the context is built, `candidate` with the keyword
+    fallback answer, `final` with the model answer, score and source, then `done`.
+    """
+    if not request.question or not request.question.strip():
+        raise HTTPException(status_code=400, detail="Question cannot be empty")
+    
+    _qa_model.start()
+    
+    return StreamingResponse(
+        stream_answer_events(request.question),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.post("/ask/batch", response_model=BatchAnswerResponse)
+async def ask_batch(request: BatchQuestionRequest):
+    """
+    Answer many questions in one request.
+    
+    All questions are answered against the same messages snapshot. Duplicate
+    questions (after normalization) are answered once, and model inference for
+    concurrent questions is micro-batched. Answers come back in request order;
+    a failing question gets an `error` instead of failing the whole batch.
+    """
+    if len(request.questions) > ASK_BATCH_MAX_QUESTIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many questions: {len(request.questions)} (max {ASK_BATCH_MAX_QUESTIONS})"
+        )
+    
+    _qa_model.start()
+    
+    try:
+        snapshot = await fetch_messages_snapshot_async()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error processing questions: {str(e)}")
+    
+    # One task per distinct question, shared by its duplicates
+    semaphore = asyncio.Semaphore(max(1, ASK_BATCH_CONCURRENCY))
+    
+    async def answer_one(question: str) -> str:
+        async with semaphore:
+            return await answer_from_snapshot(question, snapshot)
+    
+    tasks = {}
+    for question in request.questions:
+        if question and question.strip():
+            key = normalize_question(question)
+            if key not in tasks:
+                tasks[key] = asyncio.ensure_future(answer_one(question))
+    await asyncio.gather(*tasks.values(), return_exceptions=True)
+    
+    answers = []
+    for question in request.questions:
+        if not question or not question.strip():
+            answers.append(BatchAnswerItem(question=question, error="Question cannot be empty"))
+            continue
+        task = tasks[normalize_question(question)]
+        if task.exception() is not None:
+            answers.append(BatchAnswerItem(question=question, error=f"Error processing question: {task.exception()}"))
+        else:
+            answers.append(BatchAnswerItem(question=question, answer=task.result()))
+    
+    return BatchAnswerResponse(answers=answers)
+
+
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv("PORT", 8001))
@@ -0,0 +1,92 @@
+"""
+Dynamic micro-batching for model inference.
+
+Concurrent requests submit single items; the batcher holds them for a short
+window (or until the batch is full), runs them through the model as one
+padded batch on an executor thread, and resolves each caller's future with
+its own result.
+"""
+import asyncio
+import time
+from concurrent.futures import Executor
+from typing import Callable, Optional
+
+
+class MicroBatcher:
+    """Collects items submitted from the event loop into batches for run_batch."""
+
+    def __init__(self, run_batch: Callable[[list], list], executor: Executor,
+                 max_batch_size: int = 8, max_wait_ms: float = 5.0):
+        self.run_batch = run_batch
+        self.executor = executor
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait_ms = max(0.0, max_wait_ms)
+        self._pending = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+        # Counters exposed through stats()
+        self.batches_run = 0
+        self.items_run = 0
+        self.largest_batch = 0
+        self.full_batches = 0
+        self.failed_batches = 0
+        self.batch_seconds_total = 0.0
+
+    async def submit(self, item):
+        """Queue one item and wait for its result."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait_ms / 1000.0, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._pending:
+            batch = self._pending[:self.max_batch_size]
+            del self._pending[:self.max_batch_size]
+            asyncio.ensure_future(self._run(batch))
+
+    async def _run(self, batch: list):
+        items = [item for item, _ in batch]
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        try:
+            results = await loop.run_in_executor(self.executor, self.run_batch, items)
+        except Exception as e:
+            self.failed_batches += 1
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self.batches_run += 1
+            self.items_run += len(batch)
+            self.largest_batch = max(self.largest_batch, len(batch))
+            if len(batch) == self.max_batch_size:
+                self.full_batches += 1
+            self.batch_seconds_total += time.perf_counter() - started
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self) -> dict:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+            "batches": self.batches_run,
+            "items": self.items_run,
+            "failed_batches": self.failed_batches,
+            "full_batches": self.full_batches,
+            "largest_batch": self.largest_batch,
+            "mean_batch_size": (self.items_run / self.batches_run) if self.batches_run else 0.0,
+            "batch_seconds_total": self.batch_seconds_total,
+            "queued": len(self._pending),
+        }
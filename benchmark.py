@@ -0,0 +1,198 @@
+"""
+Offline load test for /ask against a synthetic dataset.
+
+Starts the mock messages API (mock_messages_api.py) with --messages synthetic
+messages, starts the app with uvicorn pointed at it (or uses --app-url), then
+sends --requests questions at --concurrency. Reports throughput and
+p50/p95/p99 latency overall and per answer path (from the X-Answer-Path
+header: pipeline, remote, simple, cache, ...).
+
+Questions are drawn from templates over the synthetic members;
+--distinct bounds how many different questions are asked, which controls the
+answer cache hit rate.
+
+Usage: python benchmark.py [--messages 10000] [--requests 500] [--concurrency 16]
+       [--distinct 200] [--workers 1] [--local-model 0]
+       [--app-url http://... --mock-port 8765]
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+from mock_messages_api import CITIES, default_users, start_mock_server, user_for
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+QUESTION_TEMPLATES = [
+    "When is {first} planning a trip to {city}?",
+    "How many cars does {name} have?",
+    "What are {first}'s favorite restaurants?",
+    "How many tickets does {name} need for the opera?",
+    "Where did {name} move to?",
+]
+
+
+def make_questions(count: int, users: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    questions = []
+    for _ in range(count):
+        _, name = user_for(rng.randrange(users))
+        questions.append(rng.choice(QUESTION_TEMPLATES).format(
+            name=name, first=name.split()[0], city=rng.choice(CITIES)
+        ))
+    return questions
+
+
+def percentile(values: list, pct: float) -> float:
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    rank = max(1, int(round(pct / 100 * len(ordered))))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def start_app(port: int, messages_url: str, workers: int, local_model: str) -> subprocess.Popen:
+    env = dict(os.environ)
+    env.update({
+        "MESSAGES_API_URL": messages_url,
+        "LOCAL_MODEL": local_model,
+        # Measure the real load path, not a snapshot left over from another run
+        "SNAPSHOT_FILE": "",
+        "SNAPSHOT_BUNDLE": "",
+    })
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--port", str(port), "--workers", str(workers),
+         "--log-level", "warning"],
+        cwd=ROOT, env=env
+    )
+
+
+async def wait_until_up(client: httpx.AsyncClient, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/health")).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("app did not come up")
+
+
+async def wait_for_model(client: httpx.AsyncClient, timeout: float = 600):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        response = await client.get("/ready")
+        if response.status_code == 200:
+            return response.json().get("status")
+        await asyncio.sleep(1)
+    raise RuntimeError("model did not become ready")
+
+
+async def drive(client: httpx.AsyncClient, questions: list, concurrency: int) -> list:
+    """Send every question, at most `concurrency` in flight; returns (path, seconds, status) per request."""
+    queue = iter(questions)
+    results = []
+
+    async def worker():
+        for question in queue:
+            started = time.perf_counter()
+            try:
+                response = await client.post("/ask", json={"question": question})
+                path = response.headers.get("X-Answer-Path", "unknown")
+                status = response.status_code
+            except httpx.HTTPError as e:
+                path, status = f"error:{type(e).__name__}", 0
+            results.append((path, time.perf_counter() - started, status))
+
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    return results
+
+
+def report(results: list, elapsed: float):
+    def row(label: str, latencies: list):
+        ms = [s * 1000 for s in latencies]
+        print(f"  {label:<16} {len(ms):>7} {statistics.mean(ms):9.1f} {percentile(ms, 50):9.1f} "
+              f"{percentile(ms, 95):9.1f} {percentile(ms, 99):9.1f} {max(ms):9.1f}")
+
+    errors = sum(1 for _, _, status in results if status != 200)
+    print(f"\nRequests: {len(results)}  errors: {errors}  elapsed: {elapsed:.2f} s  "
+          f"throughput: {len(results) / elapsed:.1f} req/s")
+    print(f"  {'path':<16} {'count':>7} {'mean ms':>9} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}")
+    row("all", [seconds for _, seconds, _ in results])
+    by_path = {}
+    for path, seconds, _ in results:
+        by_path.setdefault(path, []).append(seconds)
+    for path in sorted(by_path, key=lambda p: -len(by_path[p])):
+        row(path, by_path[path])
+
+
+async def run(args):
+    server = start_mock_server(args.messages, port=args.mock_port, users=args.users, seed=args.seed)
+    users = server.users
+    print(f"Mock messages API: {args.messages} messages from {users} members at {server.url}")
+
+    app_process = None
+    app_url = args.app_url
+    if app_url is None:
+        app_url = f"http://127.0.0.1:{args.port}"
+        app_process = start_app(args.port, server.url, args.workers, args.local_model)
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    try:
+        async with httpx.AsyncClient(base_url=app_url, timeout=args.timeout, limits=limits) as client:
+            await wait_until_up(client)
+            if args.wait_model:
+                print(f"Model: {await wait_for_model(client)}")
+
+            # The first question pays for the cold messages load; report it separately
+            started = time.perf_counter()
+            await client.post("/ask", json={"question": "warmup"})
+            print(f"Cold first answer (includes loading {args.messages} messages): "
+                  f"{(time.perf_counter() - started) * 1000:.1f} ms, {server.requests} upstream pages")
+
+            pool = make_questions(args.distinct, users, args.seed)
+            rng = random.Random(args.seed + 1)
+            questions = [rng.choice(pool) for _ in range(args.requests)]
+
+            started = time.perf_counter()
+            results = await drive(client, questions, args.concurrency)
+            report(results, time.perf_counter() - started)
+    finally:
+        if app_process is not None:
+            app_process.terminate()
+            app_process.wait(timeout=30)
+        server.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=10000, help="synthetic dataset size (1k-1M)")
+    parser.add_argument("--users", type=int, default=None, help="distinct members (default: messages / 100)")
+    parser.add_argument("--requests", type=int, default=500, help="questions to send")
+    parser.add_argument("--concurrency", type=int, default=16, help="requests in flight")
+    parser.add_argument("--distinct", type=int, default=200, help="distinct questions in the pool")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--port", type=int, default=8011, help="port for the spawned app")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers for the spawned app")
+    parser.add_argument("--local-model", default="0", choices=("0", "1"), help="LOCAL_MODEL for the spawned app")
+    parser.add_argument("--wait-model", action="store_true", help="wait for /ready before measuring")
+    parser.add_argument("--app-url", default=None,
+                        help="benchmark an already running app instead (start it with MESSAGES_API_URL "
+                             "pointing at --mock-port)")
+    parser.add_argument("--mock-port", type=int, default=0, help="port for the mock messages API (0 = any)")
+    parser.add_argument("--timeout", type=float, default=60, help="per-request timeout in seconds")
+    args = parser.parse_args()
+    if args.users is None:
+        args.users = default_users(args.messages)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""
+Build the prebuilt messages snapshot bundled with a deployment.
+
+Fetches every message from the upstream API, builds the store and indexes
+and writes them to data/messages.snap (or --output). Serverless instances
+memory-map this file on a cold start instead of waiting for the API.
+
+Usage: python build_snapshot.py [--output data/messages.snap]
+"""
+import argparse
+import os
+import time
+
+from message_cache import MessagesSnapshot
+from messages_api import MESSAGES_API_URL, iter_messages
+from snapshot_file import read_snapshot, write_snapshot
+
+DEFAULT_OUTPUT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "messages.snap")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="snapshot file to write")
+    parser.add_argument("--url", default=MESSAGES_API_URL, help="messages API endpoint")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    snapshot = MessagesSnapshot(iter_messages(args.url), generation=1)
+    fetched = time.perf_counter()
+    write_snapshot(args.output, snapshot)
+    written = time.perf_counter()
+
+    # Read it back so a broken file never gets deployed
+    data = read_snapshot(args.output)
+    assert data.version == snapshot.version and len(data.store) == len(snapshot.messages)
+
+    print(f"Messages:   {len(snapshot.messages)}")
+    print(f"Version:    {snapshot.version}")
+    print(f"Fetch+index {fetched - started:8.2f} s")
+    print(f"Write       {written - fetched:8.2f} s")
+    print(f"Size        {os.path.getsize(args.output) / 1024:8.1f} KiB -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
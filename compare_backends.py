@@ -0,0 +1,83 @@
+"""
+Accuracy/latency comparison of the local QA backends.
+
+Builds the real contexts for the example questions, runs them through each
+backend (pytorch, onnx, onnx-int8) and reports answer, score and latency,
+plus whether each backend agrees with the PyTorch answer.
+
+Usage: python compare_backends.py [--runs 10] [--threads 4]
+"""
+import argparse
+import statistics
+import time
+
+from app import build_context_for_question, fetch_all_messages
+from qa_model import BACKENDS, load_qa_pipeline
+
+EXAMPLE_QUESTIONS = [
+    "When is Layla planning her trip to London?",
+    "How many cars does Vikram Desai have?",
+    "What are Amira's favorite restaurants?"
+]
+
+
+def time_backend(qa, contexts: dict, runs: int) -> dict:
+    """Warm the pipeline up, then time `runs` calls per question."""
+    results = {}
+    for question, context in contexts.items():
+        qa(question=question, context=context)  # warmup
+        latencies = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            result = qa(question=question, context=context)
+            latencies.append((time.perf_counter() - started) * 1000)
+        results[question] = {
+            "answer": result.get("answer", ""),
+            "score": result.get("score", 0.0),
+            "median_ms": statistics.median(latencies),
+            "p95_ms": sorted(latencies)[max(0, int(len(latencies) * 0.95) - 1)]
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10, help="timed runs per question")
+    parser.add_argument("--threads", type=int, default=None, help="intra-op threads per backend")
+    args = parser.parse_args()
+
+    messages = fetch_all_messages()
+    contexts = {q: build_context_for_question(q, messages) for q in EXAMPLE_QUESTIONS}
+
+    report = {}
+    for backend in BACKENDS:
+        qa, loaded = load_qa_pipeline(backend, args.threads)
+        if loaded != backend:
+            print(f"Skipping {backend}: not available in this environment")
+            continue
+        report[backend] = time_backend(qa, contexts, args.runs)
+
+    baseline = report.get("pytorch", {})
+    print("=" * 80)
+    print("QA BACKEND COMPARISON")
+    print("=" * 80)
+    for question in EXAMPLE_QUESTIONS:
+        print(f"\nQuestion: {question}")
+        for backend, results in report.items():
+            r = results[question]
+            agrees = ""
+            if backend != "pytorch" and question in baseline:
+                agrees = "  same answer" if r["answer"].strip() == baseline[question]["answer"].strip() else "  DIFFERENT answer"
+            print(f"  {backend:<10} {r['median_ms']:8.1f} ms median {r['p95_ms']:8.1f} ms p95  "
+                  f"score={r['score']:.3f}  answer={r['answer']!r}{agrees}")
+
+    if "pytorch" in report:
+        base_ms = statistics.mean(r["median_ms"] for r in report["pytorch"].values())
+        print("\nMean speedup vs pytorch:")
+        for backend, results in report.items():
+            mean_ms = statistics.mean(r["median_ms"] for r in results.values())
+            print(f"  {backend:<10} {base_ms / mean_ms:5.2f}x ({mean_ms:.1f} ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Ingest-time fact tables for count and attribute questions.
+
+While the index is built, each message is matched against a few statement
+patterns:
+  - quantities: "I have 4 cars", "we own 2 boats", "I need 3 tickets"
+  - favorites: "My favorite restaurants are Nobu and Zuma"
+  - locations: "I moved to Tokyo", "I live in New York"
+The newest statement wins for each (member, kind, key), so "How many cars
+does Vikram Desai have?" becomes one dictionary lookup. match_question maps
+a question onto the same (kind, key) pairs.
+"""
+import re
+from typing import Optional
+
+from message_index import STOPWORDS
+
+NUMBER_WORDS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6,
+    "seven": 7, "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12,
+}
+# Statement verbs -> the verb a question asks with
+QUANTITY_VERBS = {"have": "have", "own": "have", "need": "need", "want": "need"}
+
+_QUANTITY_RE = re.compile(
+    r"\b(?:i|we)\s+(?:now\s+|also\s+|still\s+)?(have|own|need|want)\s+"
+    r"(\d+|" + "|".join(NUMBER_WORDS) + r")\s+([a-z]+)(?:\s+([a-z]+))?",
+    re.IGNORECASE
+)
+_FAVORITE_RE = re.compile(
+    r"\bmy\s+fav(?:ou?rite)s?\s+((?:[a-z]+\s+)?[a-z]+)\s+(?:is|are)\s+([^.!?\n]+)",
+    re.IGNORECASE
+)
+# Place names are matched case-sensitively (capitalized words); the verbs are not
+_LOCATION_RE = re.compile(
+    r"\b(?i:i\s+(?:just\s+|recently\s+)?(?:moved|relocated)\s+to"
+    r"|i\s+(?:now\s+)?live\s+in|i(?:'m|\s+am)\s+(?:now\s+)?(?:living|based)\s+in)"
+    r"\s+([A-Z][\w'-]*(?:\s+[A-Z][\w'-]*)*)"
+)
+
+_HOW_MANY_RE = re.compile(r"\bhow\s+many\s+((?:[a-z]+\s+)?[a-z]+)\s+(?:does|do|did|has|have|is|will)\b", re.IGNORECASE)
+_NEED_RE = re.compile(r"\b(?:need|needs|want|wants)\b", re.IGNORECASE)
+_FAVORITE_QUESTION_RE = re.compile(r"\bfav(?:ou?rite)s?\s+([a-z]+(?:\s+[a-z]+)?)", re.IGNORECASE)
+_LOCATION_QUESTION_RE = re.compile(
+    r"^\s*where\b.*\b(?:live|lives|living|move|moved|moving|relocate|relocated|based|reside|resides)\b",
+    re.IGNORECASE
+)
+
+
+def singular(noun: str) -> str:
+    """Naive singular form used as the fact key ("cars" -> "car", "watches" -> "watch")."""
+    noun = noun.lower()
+    if noun.endswith("ies") and len(noun) > 4:
+        return noun[:-3] + "y"
+    if noun.endswith(("ches", "shes", "sses", "xes")):
+        return noun[:-2]
+    if noun.endswith("s") and not noun.endswith("ss"):
+        return noun[:-1]
+    return noun
+
+
+def _head_noun(words: list) -> Optional[str]:
+    """Last word that isn't a stopword ("vintage cars" -> "cars", "restaurant of" -> "restaurant")."""
+    words = [word for word in words if word.lower() not in STOPWORDS]
+    return words[-1] if words else None
+
+
+def extract_facts(text: str) -> list:
+    """(kind, key, value) facts stated in one message; kind is have, need, favorite or location."""
+    facts = []
+    for match in _QUANTITY_RE.finditer(text):
+        verb, amount, first, second = match.groups()
+        # "3 vintage cars" names the noun second; "4 cars insured" / "3 tickets for" first
+        noun = second if second and second.lower() not in STOPWORDS and not first.lower().endswith("s") else first
+        if noun.lower() in STOPWORDS:
+            continue
+        count = int(amount) if amount.isdigit() else NUMBER_WORDS[amount.lower()]
+        facts.append((QUANTITY_VERBS[verb.lower()], singular(noun), f"{count} {noun}"))
+    for match in _FAVORITE_RE.finditer(text):
+        noun = _head_noun(match.group(1).split())
+        if noun:
+            facts.append(("favorite", singular(noun), match.group(2).strip()))
+    for match in _LOCATION_RE.finditer(text):
+        facts.append(("location", "", match.group(1)))
+    return facts
+
+
+def match_question(question: str) -> Optional[tuple]:
+    """The (kind, key) fact a question asks for, or None if it fits no template."""
+    match = _HOW_MANY_RE.search(question)
+    if match:
+        noun = _head_noun(match.group(1).split())
+        if noun:
+            return ("need" if _NEED_RE.search(question, match.end()) else "have"), singular(noun)
+    match = _FAVORITE_QUESTION_RE.search(question)
+    if match:
+        noun = _head_noun(match.group(1).split())
+        if noun:
+            return "favorite", singular(noun)
+    if _LOCATION_QUESTION_RE.search(question):
+        return "location", ""
+    return None
+
+
+class FactIndex:
+    """Newest fact per member and (kind, key): facts[user_key][(kind, key)] = (value, msg_id)."""
+
+    def __init__(self, facts: dict):
+        self.facts = facts
+
+    @classmethod
+    def build(cls, store, by_user: dict) -> "FactIndex":
+        facts = {}
+        for user_key, msg_ids in by_user.items():
+            member = {}
+            for msg_id in msg_ids:
+                for kind, key, value in extract_facts(store.texts[msg_id]):
+                    current = member.get((kind, key))
+                    if current is None or store.epochs[msg_id] >= store.epochs[current[1]]:
+                        member[(kind, key)] = (value, msg_id)
+            if member:
+                facts[user_key] = member
+        return cls(facts)
+
+    @classmethod
+    def from_rows(cls, rows) -> "FactIndex":
+        """Inverse of rows()."""
+        facts = {}
+        for user_key, kind, key, value, msg_id in rows:
+            facts.setdefault(user_key, {})[(kind, key)] = (value, msg_id)
+        return cls(facts)
+
+    def rows(self):
+        """(user_key, kind, key, value, msg_id) for every fact, for serialization."""
+        for user_key, member in self.facts.items():
+            for (kind, key), (value, msg_id) in member.items():
+                yield user_key, kind, key, value, msg_id
+
+    def __len__(self) -> int:
+        return sum(len(member) for member in self.facts.values())
+
+    def get(self, user_key: str, kind: str, key: str = "") -> Optional[tuple]:
+        """(value, msg_id) of the member's newest fact of this kind and key, or None."""
+        member = self.facts.get(user_key)
+        return member.get((kind, key)) if member else None
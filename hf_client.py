@@ -0,0 +1,284 @@
+"""
+Resilient client for the HuggingFace Inference API.
+
+- One persistent httpx connection pool shared by all requests.
+- Learns which payload shape each endpoint accepts and stops sending the
+  shapes it rejects.
+- A circuit breaker short-circuits calls while the API is failing or reports
+  the model as loading (503), so callers fall back immediately.
+- Tight per-attempt timeouts inside an overall budget per question, with an
+  optional hedged attempt against the next endpoint when the first is slow.
+"""
+import asyncio
+import sys
+import time
+from typing import Callable, Optional
+
+import httpx
+
+QA_API_URLS = [
+    "https://api-inference.huggingface.co/models/deepset/roberta-base-squad2",
+    "https://api-inference.huggingface.co/pipeline/question-answering/deepset/roberta-base-squad2"
+]
+
+# Payload shapes accepted by different versions of the Inference API
+PAYLOAD_SHAPES = ("direct", "inputs")
+
+
+def build_payload(shape: str, question: str, context: str) -> dict:
+    if shape == "inputs":
+        return {"inputs": {"question": question, "context": context}}
+    return {"question": question, "context": context}
+
+
+def parse_answer(result) -> Optional[dict]:
+    """Extract {"answer", "score"} from the response shapes the API returns."""
+    if isinstance(result, list) and result:
+        result = result[0]
+    if not isinstance(result, dict) or "error" in result:
+        return None
+    answer = result.get("answer", result.get("text"))
+    if not answer or not answer.strip():
+        return None
+    return {"answer": answer, "score": result.get("score", 1.0)}
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and rejects calls for
+    `reset_timeout` seconds, then lets a single trial call through (half-open).
+    """
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_until = 0.0
+        self.times_opened = 0
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_until == 0.0:
+            return "closed"
+        return "open" if time.monotonic() < self.opened_until else "half_open"
+
+    def allow_request(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_until = 0.0
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self._trial_in_flight or self.failures >= self.failure_threshold:
+            self.open_for(self.reset_timeout)
+
+    def release_trial(self):
+        """Forget a trial call that ended without an outcome (e.g. it was cancelled)."""
+        self._trial_in_flight = False
+
+    def open_for(self, seconds: float):
+        self.opened_until = time.monotonic() + seconds
+        self.times_opened += 1
+        self._trial_in_flight = False
+
+
+class HFInferenceClient:
+    """Question answering through the HuggingFace Inference API."""
+
+    def __init__(self, api_key: str, urls: list = None, attempt_timeout: float = 5,
+                 request_budget: float = 12, hedge_delay: float = 2,
+                 breaker: CircuitBreaker = None, max_connections: int = 10,
+                 observe_attempt: Callable[[str, float], None] = None):
+        self.api_key = api_key
+        self.urls = list(urls or QA_API_URLS)
+        self.attempt_timeout = attempt_timeout
+        self.request_budget = request_budget
+        self.hedge_delay = hedge_delay
+        self.breaker = breaker or CircuitBreaker()
+        self.max_connections = max_connections
+        # Called with (outcome, seconds) after every attempt, e.g. to record latency metrics
+        self.observe_attempt = observe_attempt
+        self._client: Optional[httpx.AsyncClient] = None
+
+        # Learned per endpoint: the shape that worked, and shapes it rejected
+        self.preferred_shape = {}
+        self.rejected_shapes = {url: set() for url in self.urls}
+
+        self.requests = 0
+        self.short_circuited = 0
+        self.attempts = 0
+        self.hedged_attempts = 0
+        self.failures = 0
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                headers={"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json"},
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections),
+                timeout=self.attempt_timeout
+            )
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+
+    def _candidates(self) -> list:
+        """(url, shape) pairs to try, learned-good shapes first and rejected ones dropped."""
+        candidates = []
+        for url in self.urls:
+            shapes = list(PAYLOAD_SHAPES)
+            preferred = self.preferred_shape.get(url)
+            if preferred:
+                shapes = [preferred]
+            candidates.extend((url, shape) for shape in shapes if shape not in self.rejected_shapes[url])
+        if not candidates:
+            # Everything has been rejected at some point; start learning again
+            for shapes in self.rejected_shapes.values():
+                shapes.clear()
+            candidates = [(url, shape) for url in self.urls for shape in PAYLOAD_SHAPES]
+        return candidates
+
+    async def answer(self, question: str, context: str) -> Optional[dict]:
+        """
+        Return {"answer", "score"} from the API, or None if the breaker is open,
+        every attempt failed or the request budget ran out.
+        """
+        self.requests += 1
+        if not self.breaker.allow_request():
+            self.short_circuited += 1
+            return None
+
+        deadline = time.monotonic() + self.request_budget
+        try:
+            result = await self._run_hedged(self._candidates(), question, context, deadline)
+        except BaseException:
+            # If this was the half-open trial and it was cancelled (say, a
+            # streaming client disconnected), let the next call be the trial
+            self.breaker.release_trial()
+            raise
+        if result is None:
+            self.failures += 1
+            if self.breaker.state == "half_open":
+                # The trial call didn't succeed; keep the breaker open
+                self.breaker.record_failure()
+        return result
+
+    async def _run_hedged(self, candidates: list, question: str, context: str, deadline: float) -> Optional[dict]:
+        """
+        Try candidates in order. A new attempt starts when the previous one
+        fails, or (hedging) when it hasn't answered within hedge_delay.
+        """
+        remaining_candidates = iter(candidates)
+        pending = set()
+
+        def start_next() -> bool:
+            candidate = next(remaining_candidates, None)
+            if candidate is None:
+                return False
+            if pending:
+                self.hedged_attempts += 1
+            pending.add(asyncio.ensure_future(self._attempt(*candidate, question, context)))
+            return True
+
+        has_more = start_next()
+        try:
+            while pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                wait = min(self.hedge_delay, remaining) if (has_more and self.hedge_delay > 0) else remaining
+                done, _ = await asyncio.wait(pending, timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    pending.discard(task)
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        print(f"HF API attempt error: {e}", file=sys.stderr)
+                        result = None
+                    if result is not None:
+                        return result
+                if self.breaker.state == "open":
+                    return None
+                # Previous attempt failed, or it is slow enough to hedge
+                if has_more and (done or self.hedge_delay > 0):
+                    has_more = start_next()
+            return None
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _attempt(self, url: str, shape: str, question: str, context: str) -> Optional[dict]:
+        self.attempts += 1
+        started = time.perf_counter()
+        outcome = "cancelled"  # unless the attempt finishes (hedged losers are cancelled)
+        try:
+            result, outcome = await self._post(url, shape, question, context)
+            return result
+        finally:
+            if self.observe_attempt is not None:
+                self.observe_attempt(outcome, time.perf_counter() - started)
+
+    async def _post(self, url: str, shape: str, question: str, context: str) -> tuple:
+        """One request to one endpoint; returns (answer or None, outcome)."""
+        try:
+            response = await self._get_client().post(url, json=build_payload(shape, question, context))
+        except httpx.HTTPError as e:
+            print(f"HF API attempt failed ({url}): {e}", file=sys.stderr)
+            self.breaker.record_failure()
+            return None, "network_error"
+
+        if response.status_code == 200:
+            try:
+                result = parse_answer(response.json())
+            except ValueError:
+                result = None
+            if result is not None:
+                self.preferred_shape[url] = shape
+                self.breaker.record_success()
+                return result, "ok"
+            # A 200 without an answer means this endpoint doesn't understand the shape
+            self.rejected_shapes[url].add(shape)
+            return None, "rejected"
+
+        if response.status_code == 503:
+            # Model is loading: stay away for as long as the API says it needs
+            estimated = 0.0
+            try:
+                estimated = float(response.json().get("estimated_time", 0))
+            except (ValueError, AttributeError, TypeError):
+                pass
+            print("HF model is loading, using fallback", file=sys.stderr)
+            self.breaker.open_for(max(estimated, self.breaker.reset_timeout))
+            return None, "loading"
+
+        if response.status_code in (400, 422):
+            self.rejected_shapes[url].add(shape)
+            return None, "rejected"
+
+        self.breaker.record_failure()
+        return None, "http_error"
+
+    def stats(self) -> dict:
+        return {
+            "breaker_state": self.breaker.state,
+            "breaker_opened": self.breaker.times_opened,
+            "requests": self.requests,
+            "short_circuited": self.short_circuited,
+            "attempts": self.attempts,
+            "hedged_attempts": self.hedged_attempts,
+            "failures": self.failures,
+            "preferred_shapes": dict(self.preferred_shape),
+            "rejected_shapes": {url: sorted(shapes) for url, shapes in self.rejected_shapes.items() if shapes},
+        }
@@ -0,0 +1,116 @@
+"""
+Cold-start measurement for the app and the serverless entry point.
+
+Each run starts a fresh Python process that imports the entry module and then
+answers one question through the ASGI app in-process (no lifespan events, as
+under Mangum). Reports import time and time-to-first-answer per run and their
+medians, plus the slowest imports of the last run from `-X importtime`.
+With --max-import-ms / --max-first-answer-ms the script exits non-zero when a
+median exceeds the limit, so a regression fails CI.
+
+Usage: python measure_cold_start.py [--runs 5] [--entry api.index]
+       [--question "..."] [--max-import-ms 800] [--max-first-answer-ms 3000]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+CHILD = r"""
+import asyncio, importlib, json, sys, time
+started = time.perf_counter()
+module = importlib.import_module(sys.argv[1])
+imported = time.perf_counter()
+
+import httpx
+
+async def first_answer():
+    async with httpx.AsyncClient(app=module.app, base_url="http://cold-start") as client:
+        return await client.post("/ask", json={"question": sys.argv[2]}, timeout=120)
+
+response = asyncio.run(first_answer())
+answered = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "first_answer_ms": (answered - imported) * 1000,
+    "status": response.status_code,
+    "answer": response.json().get("answer") if response.status_code == 200 else response.text[:200],
+}))
+"""
+
+
+def run_once(entry: str, question: str, importtime: bool = False) -> tuple:
+    """Run one cold process; returns (result dict, stderr text)."""
+    cmd = [sys.executable]
+    if importtime:
+        cmd += ["-X", "importtime"]
+    cmd += ["-c", CHILD, entry, question]
+    proc = subprocess.run(cmd, cwd=ROOT, capture_output=True, text=True)
+    lines = [line for line in proc.stdout.splitlines() if line.startswith("{")]
+    if proc.returncode != 0 or not lines:
+        raise RuntimeError(f"cold start run failed:\n{proc.stderr[-2000:]}")
+    return json.loads(lines[-1]), proc.stderr
+
+
+def slowest_imports(importtime_log: str, top: int) -> list:
+    """(cumulative ms, module) for the top-level imports with the largest cumulative time."""
+    rows = []
+    for line in importtime_log.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|", 2)
+        if not cumulative.strip().isdigit():
+            continue
+        # Nesting depth shows as leading spaces; only count top-level imports
+        if name.startswith("  "):
+            continue
+        rows.append((int(cumulative) / 1000, name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="fresh processes to start")
+    parser.add_argument("--entry", default="api.index", help="module to import (api.index or app)")
+    parser.add_argument("--question", default="When is Layla planning her trip to London?")
+    parser.add_argument("--top", type=int, default=10, help="slowest imports to list")
+    parser.add_argument("--max-import-ms", type=float, default=None, help="fail if the median import is slower")
+    parser.add_argument("--max-first-answer-ms", type=float, default=None,
+                        help="fail if the median time to first answer is slower")
+    args = parser.parse_args()
+
+    results = []
+    log = ""
+    for i in range(args.runs):
+        result, log = run_once(args.entry, args.question, importtime=(i == args.runs - 1))
+        results.append(result)
+        print(f"run {i + 1}: import {result['import_ms']:8.1f} ms  first answer {result['first_answer_ms']:8.1f} ms  "
+              f"status={result['status']}")
+
+    import_ms = statistics.median(r["import_ms"] for r in results)
+    answer_ms = statistics.median(r["first_answer_ms"] for r in results)
+    print("=" * 80)
+    print(f"Entry:                     {args.entry}")
+    print(f"Median import:             {import_ms:8.1f} ms")
+    print(f"Median time to 1st answer: {answer_ms:8.1f} ms")
+    print(f"Answer:                    {results[-1]['answer']!r}")
+    print("\nSlowest imports (cumulative, last run; includes -X importtime overhead):")
+    for ms, name in slowest_imports(log, args.top):
+        print(f"  {ms:8.1f} ms  {name}")
+
+    failed = False
+    if args.max_import_ms is not None and import_ms > args.max_import_ms:
+        print(f"\nFAIL: median import {import_ms:.1f} ms > {args.max_import_ms:.1f} ms")
+        failed = True
+    if args.max_first_answer_ms is not None and answer_ms > args.max_first_answer_ms:
+        print(f"\nFAIL: median time to first answer {answer_ms:.1f} ms > {args.max_first_answer_ms:.1f} ms")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+"""
+TTL cache for the member messages snapshot.
+
+Serves the current snapshot immediately and refreshes it in the background
+once it is older than the TTL (stale-while-revalidate). A refresh builds a
+complete new snapshot, including derived indexes, before swapping it in with
+a single reference assignment, so readers never see a half-built state.
+
+Loads are single-flight: concurrent misses and refreshes share one upstream
+fetch and all waiters receive its result or its error.
+
+With a snapshot file configured, each new snapshot is also written to disk
+(see snapshot_file), and a cold cache memory-maps the last one, or a bundled
+prebuilt one, instead of waiting for the upstream fetch; a refresh follows
+once it is older than the TTL.
+
+A refresh that finds the same content (same digest) keeps the current
+snapshot instead of rebuilding its indexes. After a failed load, background
+refreshes triggered by requests back off exponentially, capped at the TTL.
+"""
+import hashlib
+import os
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Iterable, Optional
+
+from fact_index import FactIndex
+from message_index import MessageIndex
+from message_store import MessageStore
+from snapshot_file import SnapshotFormatError, read_snapshot, write_snapshot
+
+
+class MessagesSnapshot:
+    """
+    Immutable view of the messages and the indexes derived from them.
+
+    `version` is a digest of the message contents, so two loads of identical
+    data share a version; `generation` counts loads.
+    """
+
+    def __init__(self, messages, generation: int):
+        started = time.monotonic()
+        store, version = self.read(messages)
+        self._build(store, version, generation, started)
+
+    def _build(self, store: MessageStore, version: str, generation: int, started: float):
+        self.messages = store
+        self.index = MessageIndex(store)
+        self.facts = FactIndex.build(store, self.index.by_user)
+        self.version = version
+        self.generation = generation
+        self.loaded_at = time.monotonic()
+        # Where the data came from and how long fetching and indexing it took
+        self.source = "api"
+        self.load_seconds = self.loaded_at - started
+
+    @classmethod
+    def read(cls, messages) -> tuple:
+        """
+        (MessageStore, content version) for an iterable of message dicts,
+        consumed once. Lets a caller compare versions before paying for the
+        indexes (see from_store).
+        """
+        digest = hashlib.blake2b(digest_size=8)
+        # Raw message dicts are dropped as soon as they are in the store
+        store = MessageStore.from_messages(cls._hashed(messages, digest))
+        return store, digest.hexdigest()
+
+    @classmethod
+    def from_store(cls, store: MessageStore, version: str, generation: int,
+                   started: Optional[float] = None) -> "MessagesSnapshot":
+        """Snapshot indexing a store returned by read(); started is when reading began."""
+        snapshot = cls.__new__(cls)
+        snapshot._build(store, version, generation, started if started is not None else time.monotonic())
+        return snapshot
+
+    @staticmethod
+    def _hashed(messages, digest):
+        for msg in messages:
+            digest.update("\x1f".join(
+                str(msg.get(field, "")) for field in ("id", "user_id", "user_name", "timestamp", "message")
+            ).encode("utf-8", "surrogatepass"))
+            digest.update(b"\x1e")
+            yield msg
+
+    @classmethod
+    def from_file(cls, data, generation: int) -> "MessagesSnapshot":
+        """Snapshot backed by a memory-mapped snapshot file (snapshot_file.MappedSnapshotData)."""
+        snapshot = cls.__new__(cls)
+        snapshot.messages = data.store
+        snapshot.index = data.index
+        snapshot.facts = data.facts
+        snapshot.version = data.version
+        snapshot.generation = generation
+        # Age counts from when the file was written, so old files get refreshed promptly
+        snapshot.loaded_at = time.monotonic() - max(0.0, time.time() - data.created_at)
+        snapshot.mapped = data
+        snapshot.source = "file"
+        snapshot.load_seconds = 0.0
+        return snapshot
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.loaded_at
+
+    def mark_fresh(self):
+        """Restart the age after a refresh found the same content."""
+        self.loaded_at = time.monotonic()
+
+
+class MessageCache:
+    """Holds the current MessagesSnapshot and keeps it fresh."""
+
+    def __init__(self, loader: Callable[[], Iterable[dict]], ttl: float,
+                 snapshot_path: Optional[str] = None, tokenizer_name: Optional[str] = None,
+                 bundle_path: Optional[str] = None, min_retry_delay: float = 1.0):
+        self.loader = loader
+        self.ttl = ttl
+        self.snapshot_path = snapshot_path
+        # Read-only prebuilt snapshot shipped with a deployment, used when
+        # snapshot_path doesn't exist yet
+        self.bundle_path = bundle_path
+        # Cached line token ids in a file are only reused if made by this tokenizer
+        self.tokenizer_name = tokenizer_name
+        self._file_lock = threading.Lock()
+        self._saved = None  # (version, has token ids) last written to snapshot_path
+        self._snapshot: Optional[MessagesSnapshot] = None
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._inflight: Optional[Future] = None
+        self._stop = threading.Event()
+        # Run on every new snapshot before it is swapped in
+        self._snapshot_hooks = []
+        self._refresh_thread = None
+        # Background refreshes after upstream failures wait min_retry_delay,
+        # doubling per consecutive failure up to the TTL
+        self.min_retry_delay = min_retry_delay
+        self._failures = 0
+        self._retry_at = 0.0
+
+    def add_snapshot_hook(self, hook: Callable[[MessagesSnapshot], None]):
+        """Register a callable that derives extra data for each new snapshot."""
+        self._snapshot_hooks.append(hook)
+
+    @property
+    def snapshot(self) -> Optional[MessagesSnapshot]:
+        return self._snapshot
+
+    def is_stale(self) -> bool:
+        snapshot = self._snapshot
+        return snapshot is None or (self.ttl > 0 and snapshot.age > self.ttl)
+
+    def get(self) -> MessagesSnapshot:
+        """
+        Return the current snapshot.
+
+        Only a cold cache blocks on the loader; a stale snapshot is returned
+        as-is while a background refresh is scheduled.
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            snapshot = self.load_file()
+        if snapshot is None:
+            return self.refresh()
+        if self.is_stale():
+            self.refresh_in_background()
+        return snapshot
+
+    def refresh(self) -> MessagesSnapshot:
+        """
+        Load messages, build a new snapshot and swap it in. If the content
+        is unchanged, the current snapshot is kept (and counts as fresh)
+        without rebuilding its indexes or rerunning the hooks.
+
+        If a load is already in flight, wait for it instead of starting another.
+        """
+        with self._lock:
+            future = self._inflight
+            leader = future is None
+            if leader:
+                future = self._inflight = Future()
+
+        if leader:
+            try:
+                started = time.monotonic()
+                # The loader may be a generator; the store is filled as it streams
+                store, version = MessagesSnapshot.read(self.loader())
+                current = self._snapshot
+                if current is not None and current.version == version:
+                    current.mark_fresh()
+                    snapshot = current
+                else:
+                    with self._lock:
+                        self._generation += 1
+                        generation = self._generation
+                    snapshot = MessagesSnapshot.from_store(store, version, generation, started)
+                    self._run_hooks(snapshot)
+                    self._snapshot = snapshot
+                del store
+                self._failures, self._retry_at = 0, 0.0
+                future.set_result(snapshot)
+                if self.snapshot_path and snapshot is not current:
+                    threading.Thread(target=self.save_file, args=(snapshot,), daemon=True).start()
+            except BaseException as e:
+                self._failures += 1
+                delay = self.min_retry_delay * 2 ** min(self._failures - 1, 30)
+                if self.ttl > 0:
+                    delay = min(delay, self.ttl)
+                self._retry_at = time.monotonic() + delay
+                future.set_exception(e)
+            finally:
+                with self._lock:
+                    self._inflight = None
+        return future.result()
+
+    def _run_hooks(self, snapshot: MessagesSnapshot):
+        for hook in self._snapshot_hooks:
+            try:
+                hook(snapshot)
+            except Exception as e:
+                print(f"Snapshot hook failed: {e}", file=sys.stderr)
+
+    def load_file(self) -> Optional[MessagesSnapshot]:
+        """
+        Serve from the snapshot file (or the bundled one) if the cache is
+        still empty. Returns the current snapshot, or None if there is no
+        usable file.
+        """
+        paths = [path for path in (self.snapshot_path, self.bundle_path) if path and os.path.exists(path)]
+        if not paths:
+            return self._snapshot
+        with self._file_lock:
+            if self._snapshot is not None:
+                return self._snapshot
+            data = None
+            started = time.monotonic()
+            for path in paths:
+                try:
+                    data = read_snapshot(path)
+                    break
+                except (OSError, ValueError, KeyError, SnapshotFormatError) as e:
+                    print(f"Warning: Could not load snapshot file {path}: {e}", file=sys.stderr)
+            if data is None:
+                return None
+            if data.tokenizer != self.tokenizer_name:
+                data.store.line_token_ids = None
+            with self._lock:
+                self._generation += 1
+                generation = self._generation
+            snapshot = MessagesSnapshot.from_file(data, generation)
+            snapshot.load_seconds = time.monotonic() - started
+            self._run_hooks(snapshot)
+            self._saved = (snapshot.version, snapshot.messages.line_token_ids is not None)
+            if self._snapshot is None:
+                self._snapshot = snapshot
+            return self._snapshot
+
+    def save_file(self, snapshot: Optional[MessagesSnapshot] = None):
+        """Write a snapshot (default: the current one) to the snapshot file if it has changed."""
+        snapshot = snapshot or self._snapshot
+        if not self.snapshot_path or snapshot is None:
+            return
+        key = (snapshot.version, snapshot.messages.line_token_ids is not None)
+        with self._file_lock:
+            if key == self._saved or snapshot is not self._snapshot:
+                return
+            try:
+                write_snapshot(self.snapshot_path, snapshot, self.tokenizer_name)
+                self._saved = key
+            except OSError as e:
+                print(f"Warning: Could not write snapshot file {self.snapshot_path}: {e}", file=sys.stderr)
+
+    def refresh_in_background(self) -> bool:
+        """
+        Start a refresh thread unless a load is already in flight or the
+        last one failed less than the backoff delay ago (the periodic refresh
+        loop still retries on its own schedule).
+        """
+        if self._inflight is not None or time.monotonic() < self._retry_at:
+            return False
+        threading.Thread(target=self._refresh_quietly, daemon=True).start()
+        return True
+
+    def _refresh_quietly(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            # Keep serving the previous snapshot; the next tick will retry
+            print(f"Background messages refresh failed: {e}", file=sys.stderr)
+
+    def start(self):
+        """Warm the cache and refresh it every TTL seconds in a daemon thread."""
+        if self._refresh_thread is not None:
+            return
+        self._stop.clear()
+        self._refresh_thread = threading.Thread(target=self._refresh_loop, daemon=True)
+        self._refresh_thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._refresh_thread = None
+
+    def _refresh_loop(self):
+        if self._snapshot is None:
+            self.load_file()
+        if self.is_stale():
+            self._refresh_quietly()
+        while self.ttl > 0 and not self._stop.wait(self.ttl):
+            self._refresh_quietly()
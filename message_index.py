@@ -0,0 +1,271 @@
+"""
+In-memory indexes over member messages.
+
+Built once when messages are loaded so that each question only touches the
+messages that share a term or a member name with it, instead of rescanning
+the whole dataset per request. Matches are ranked with Okapi BM25.
+
+Member names in questions are resolved with a token trie over the distinct
+user names (full names and first names), scanned in a single left-to-right
+pass taking the longest match at each position. "Vikram Desai" resolves to
+one member rather than two independent substring checks, and "Amira's"
+resolves like "Amira". A first name several members share is reported as
+ambiguous, and "Omar Nasser" is not taken to mean Omar Haddad.
+"""
+import heapq
+import math
+import re
+from array import array
+from collections import Counter, defaultdict
+from typing import Optional
+
+from temporal_index import TemporalIndex
+
+# BM25 parameters (standard defaults)
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+# Name trie keys holding the user keys of a complete name and of a first name (never tokens)
+_LEAF = "\0"
+_FIRST = "\1"
+# Like _TOKEN_RE on text that hasn't been lowercased, to see which words are capitalized
+_NAME_TOKEN_RE = re.compile(_TOKEN_RE.pattern, re.IGNORECASE)
+
+# Words that carry no signal about which message answers a question
+STOPWORDS = frozenset("""
+a about above after again all am an and any are as at be been before being
+below between both but by can could did do does doing down during each few
+for from further had has have having he her here hers herself him himself his
+how i if in into is it its itself just me more most my myself no nor not now
+of off on once only or other our ours ourselves out over own same she should
+so some such than that the their theirs them themselves then there these they
+this those through to too under until up very was we were what when where
+which while who whom why will with would you your yours yourself yourselves
+many much please thanks thank get got going want like need let also
+""".split())
+
+
+def tokenize(text: str) -> list:
+    """Lowercase text and split it into word tokens, dropping possessive suffixes."""
+    tokens = []
+    for token in _TOKEN_RE.findall(text.lower()):
+        if token.endswith("'s"):
+            token = token[:-2]
+        tokens.append(token)
+    return tokens
+
+
+def query_terms(text: str) -> list:
+    """Distinct non-stopword tokens of a question, in order of appearance."""
+    return list(dict.fromkeys(t for t in tokenize(text) if t not in STOPWORDS))
+
+
+class NameMatches:
+    """
+    Members a text mentions. user_keys are the members named unambiguously;
+    ambiguous holds (mention, candidate user keys) for names several members
+    share; partial holds first-name mentions followed by a surname that no
+    member with that first name has ("Omar Nasser" when only Omar Haddad
+    exists), which are treated as unknown people.
+    """
+
+    __slots__ = ("user_keys", "ambiguous", "partial")
+
+    def __init__(self, user_keys: list, ambiguous: list, partial: list):
+        self.user_keys = user_keys
+        self.ambiguous = ambiguous
+        self.partial = partial
+
+    @property
+    def unique(self) -> Optional[str]:
+        """The one member the text names, or None if it names none, several or any ambiguously."""
+        if len(self.user_keys) == 1 and not self.ambiguous and not self.partial:
+            return self.user_keys[0]
+        return None
+
+    @property
+    def candidates(self) -> list:
+        """Every member the text may mean (named or ambiguous candidates), in order of mention."""
+        keys = dict.fromkeys(self.user_keys)
+        for _, user_keys in self.ambiguous:
+            keys.update(dict.fromkeys(user_keys))
+        return list(keys)
+
+
+class NameResolver:
+    """Token trie over member names mapping mentions (full or first name) to user keys."""
+
+    def __init__(self, user_names: dict):
+        # user_names: user key -> display name (any case)
+        self.user_names = dict(user_names)
+        self._trie = {}
+        self.max_length = 0
+        first_names = {}
+        for user_key, name in self.user_names.items():
+            tokens = tokenize(name)
+            if not tokens:
+                continue
+            self._add(tokens, user_key, _LEAF)
+            first_names.setdefault(tokens[0], []).append(user_key)
+        for first, user_keys in first_names.items():
+            # A first name that is also an ordinary word ("will", "may") would match too often
+            if first in STOPWORDS:
+                continue
+            # Shared first names are kept with all their members so a mention can be reported as ambiguous
+            for user_key in user_keys:
+                self._add([first], user_key, _FIRST)
+
+    def _add(self, tokens: list, user_key: str, leaf: str):
+        node = self._trie
+        for token in tokens:
+            node = node.setdefault(token, {})
+        keys = node.setdefault(leaf, [])
+        if user_key not in keys:
+            keys.append(user_key)
+        self.max_length = max(self.max_length, len(tokens))
+
+    def __len__(self) -> int:
+        return len(self.user_names)
+
+    def match(self, text: str) -> NameMatches:
+        """
+        Scan text left to right taking the longest full-name match at each
+        position, falling back to a first name. A first name only counts on
+        its own when one member has it and the next word isn't a capitalized
+        surname that member lacks.
+        """
+        tokens, capitalized = [], []
+        for m in _NAME_TOKEN_RE.finditer(text):
+            token = m.group(0).lower()
+            tokens.append(token[:-2] if token.endswith("'s") else token)
+            capitalized.append(m.group(0)[0].isupper())
+
+        found, ambiguous, partial = {}, [], []
+        i = 0
+        while i < len(tokens):
+            node = self._trie
+            match, match_end, first_name = None, i, False
+            for j in range(i, min(len(tokens), i + self.max_length)):
+                node = node.get(tokens[j])
+                if node is None:
+                    break
+                if _LEAF in node:
+                    match, match_end, first_name = node[_LEAF], j + 1, False
+                elif j == i and _FIRST in node:
+                    match, match_end, first_name = node[_FIRST], j + 1, True
+            if match is None:
+                i += 1
+                continue
+            mention = " ".join(tokens[i:match_end])
+            if first_name and match_end < len(tokens) and capitalized[match_end]:
+                partial.append(f"{mention} {tokens[match_end]}")
+                i = match_end + 1
+                continue
+            if len(match) > 1:
+                ambiguous.append((mention, list(match)))
+            else:
+                found.setdefault(match[0], None)
+            i = match_end
+        return NameMatches(list(found), ambiguous, partial)
+
+    def resolve(self, text: str) -> list:
+        """
+        User keys of every member text may mention, in order of mention, for
+        ranking. Use match() when the answer depends on which member is meant.
+        """
+        return self.match(text).candidates
+
+    def names(self, text: str) -> list:
+        """Display names of the members text may mention."""
+        return [self.user_names[user_key] for user_key in self.resolve(text)]
+
+
+class MessageIndex:
+    """
+    Inverted index with BM25 statistics plus a user -> message-ids index,
+    built over a MessageStore's pre-tokenized messages.
+
+    Postings are parallel arrays of message ids and term frequencies;
+    document lengths, the average length and per-term IDF are precomputed.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        # Optional dense retrieval index (semantic_index.SemanticIndex), attached after build
+        self.semantic = None
+        postings = {}
+        by_user = defaultdict(lambda: array("I"))
+        self.doc_lengths = array("I")
+
+        for msg_id, tokens in enumerate(store.tokens):
+            self.doc_lengths.append(len(tokens))
+            for token, tf in Counter(tokens).items():
+                posting = postings.get(token)
+                if posting is None:
+                    posting = postings[token] = (array("I"), array("I"))
+                posting[0].append(msg_id)
+                posting[1].append(tf)
+            user_key = store.user_ids[msg_id] or store.user_names[msg_id]
+            if user_key:
+                by_user[user_key].append(msg_id)
+
+        self.postings = postings
+        self.by_user = dict(by_user)
+        # Lowercased display name per user, for matching names in questions
+        self.user_names = {}
+        for user_key, msg_ids in self.by_user.items():
+            self.user_names[user_key] = store.user_names[msg_ids[0]].lower()
+
+        self.names = NameResolver(self.user_names)
+        # Dates each member mentions, resolved against the message timestamps
+        self.timeline = TemporalIndex.build(store, self.by_user)
+
+        n_docs = len(store)
+        self.avg_doc_length = (sum(self.doc_lengths) / n_docs) if n_docs else 0.0
+        self.idf = {
+            token: math.log(1 + (n_docs - len(ids) + 0.5) / (len(ids) + 0.5))
+            for token, (ids, _) in self.postings.items()
+        }
+
+    def ids_for_question(self, question: str) -> set:
+        """
+        Ids of messages written by the members mentioned by name in the
+        question, including every member a shared first name may mean.
+        """
+        ids = set()
+        for user_key in self.names.resolve(question):
+            ids.update(self.by_user[user_key])
+        return ids
+
+    def bm25_scores(self, terms) -> dict:
+        """BM25 score of every message containing at least one of the terms."""
+        scores = defaultdict(float)
+        avg_len = self.avg_doc_length or 1.0
+        for term in terms:
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = self.idf[term]
+            for msg_id, tf in zip(*posting):
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths[msg_id] / avg_len)
+                scores[msg_id] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+        return scores
+
+    def top_k(self, terms, top_k: int, preferred_ids: set = None) -> list:
+        """
+        Ids of the top_k messages ranked by BM25 score.
+
+        Messages in preferred_ids (e.g. written by a member named in the
+        question) rank ahead of all others and are included even without a
+        term match; ties keep API order.
+        """
+        scores = self.bm25_scores(terms)
+        preferred_ids = preferred_ids or set()
+        candidates = set(scores)
+        candidates.update(preferred_ids)
+        # Partial selection: only the best top_k of possibly many candidates are ordered
+        return heapq.nsmallest(
+            top_k, candidates,
+            key=lambda msg_id: (msg_id not in preferred_ids, -scores.get(msg_id, 0.0), msg_id),
+        )
@@ -0,0 +1,124 @@
+"""
+Compact, column-oriented store of member messages.
+
+Each message is split into parallel columns indexed by message id. User ids,
+user names and tokens are interned so repeated values share one
+object, timestamps are parsed once into integer epochs, and the line used in
+QA contexts is formatted once at load time instead of on every request.
+"""
+import sys
+from array import array
+from datetime import datetime, timezone
+
+from message_index import tokenize
+
+
+def parse_epoch(timestamp: str) -> int:
+    """Seconds since the Unix epoch for an ISO-8601 timestamp, or 0 if unparseable."""
+    if not timestamp:
+        return 0
+    try:
+        return int(datetime.fromisoformat(timestamp.replace("Z", "+00:00")).timestamp())
+    except (ValueError, OverflowError, OSError):
+        return 0
+
+
+def format_epoch(epoch: int) -> str:
+    """ISO-8601 UTC timestamp for an epoch produced by parse_epoch."""
+    if not epoch:
+        return ""
+    return datetime.fromtimestamp(epoch, timezone.utc).isoformat()
+
+
+def format_context_line(user_name: str, message: str, timestamp: str) -> str:
+    """The line a message contributes to a QA context."""
+    return f"{user_name}: {message} (Date: {timestamp[:10]})\n"
+
+
+class MessageStore:
+    """
+    Messages as parallel columns. Behaves as a read-only sequence of message
+    dicts for callers that want the original shape (timestamps come back
+    normalized to UTC).
+    """
+
+    __slots__ = ("ids", "user_ids", "user_names", "epochs", "texts", "tokens", "lines", "line_token_ids")
+
+    def __init__(self):
+        self.ids = []
+        self.user_ids = []
+        self.user_names = []
+        self.epochs = array("q")
+        self.texts = []
+        self.tokens = []
+        self.lines = []
+        # Model tokenizer ids per context line (TokenIdColumn), filled in
+        # once a tokenizer is available
+        self.line_token_ids = None
+
+    @classmethod
+    def from_messages(cls, messages) -> "MessageStore":
+        """Build a store from any iterable of message dicts, consuming it once."""
+        store = cls()
+        for msg in messages:
+            store.append(msg)
+        return store
+
+    def append(self, msg: dict) -> int:
+        """Add a message dict and return its id in the store."""
+        intern = sys.intern
+        msg_id = len(self.ids)
+        timestamp = msg.get("timestamp", "") or ""
+        text = msg.get("message", "") or ""
+
+        self.ids.append(msg.get("id"))
+        self.user_ids.append(intern(msg.get("user_id", "") or ""))
+        self.user_names.append(intern(msg.get("user_name", "") or ""))
+        self.epochs.append(parse_epoch(timestamp))
+        self.texts.append(text)
+        self.tokens.append(tuple(intern(token) for token in tokenize(text)))
+        self.lines.append(format_context_line(msg.get("user_name", "Unknown"), text, timestamp))
+        return msg_id
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __getitem__(self, msg_id: int) -> dict:
+        return {
+            "id": self.ids[msg_id],
+            "user_id": self.user_ids[msg_id],
+            "user_name": self.user_names[msg_id],
+            "timestamp": format_epoch(self.epochs[msg_id]),
+            "message": self.texts[msg_id],
+        }
+
+    def __iter__(self):
+        for msg_id in range(len(self.ids)):
+            yield self[msg_id]
+
+
+class TokenIdColumn:
+    """Variable-length token id sequences stored as one flat array plus offsets."""
+
+    __slots__ = ("flat", "offsets")
+
+    def __init__(self, flat: array = None, offsets: array = None):
+        self.flat = flat if flat is not None else array("I")
+        self.offsets = offsets if offsets is not None else array("I", [0])
+
+    @classmethod
+    def from_sequences(cls, sequences) -> "TokenIdColumn":
+        column = cls()
+        for ids in sequences:
+            column.flat.extend(ids)
+            column.offsets.append(len(column.flat))
+        return column
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int):
+        return self.flat[self.offsets[i]:self.offsets[i + 1]]
+
+    def length(self, i: int) -> int:
+        return self.offsets[i + 1] - self.offsets[i]
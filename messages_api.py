@@ -0,0 +1,58 @@
+"""
+Client for the public member messages API.
+
+Messages are fetched page by page using the API's skip/limit parameters and
+yielded as they arrive, so callers can index them without holding the whole
+dataset's raw response in memory at once.
+"""
+import os
+
+import requests
+
+# Overridable so benchmarks and tests can point at a local stand-in (see mock_messages_api.py)
+MESSAGES_API_URL = os.getenv("MESSAGES_API_URL", "https://november7-730026606190.europe-west1.run.app/messages")
+DEFAULT_PAGE_SIZE = 500
+
+
+def iter_messages(url: str = MESSAGES_API_URL, page_size: int = DEFAULT_PAGE_SIZE,
+                  timeout: float = 30, session: requests.Session = None):
+    """
+    Yield every message from the API, one page at a time.
+
+    The timeout applies per page rather than to the whole download. Raises
+    requests.RequestException if any page fails.
+    """
+    http = session or requests.Session()
+    skip = 0
+    first_id_of_previous_page = None
+
+    try:
+        while True:
+            response = http.get(url, params={"skip": skip, "limit": page_size}, timeout=timeout)
+            response.raise_for_status()
+            data = response.json()
+            items = data.get("items", [])
+            total = data.get("total")
+            del data, response
+
+            # Nothing more to page through, whatever total says (skip can't advance)
+            if not items:
+                return
+            # Guard against an upstream that ignores skip and repeats the same page
+            if first_id_of_previous_page is not None and items[0].get("id") == first_id_of_previous_page:
+                return
+            first_id_of_previous_page = items[0].get("id")
+
+            yield from items
+            skip += len(items)
+
+            # Trust the reported total: the upstream may cap limit below page_size.
+            # Without one, a short page (or an upstream that ignored limit) means we're done
+            if total is not None:
+                if skip >= total:
+                    return
+            elif len(items) != page_size:
+                return
+    finally:
+        if session is None:
+            http.close()
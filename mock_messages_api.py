@@ -0,0 +1,160 @@
+"""
+Local stand-in for the member messages API, serving a synthetic dataset.
+
+Implements the same GET /messages?skip=&limit= contract ({"total", "items"})
+as the real API, capping limit at 100 like an upstream whose maximum page is
+smaller than the one the app asks for. Message i is a pure function of
+(i, seed), so datasets of any size (1k to 1M+) are reproducible and cost no
+memory: pages are generated on request.
+
+Usage: python mock_messages_api.py [--messages 100000] [--port 8765]
+       then run the app with MESSAGES_API_URL=http://127.0.0.1:8765/messages
+"""
+import argparse
+import json
+import random
+import threading
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+FIRST_NAMES = [
+    "Layla", "Vikram", "Amira", "Sophia", "Fatima", "Armand", "Hans", "Lily", "Lorenzo", "Thiago",
+    "Mei", "Kenji", "Olivia", "Noah", "Isabella", "Mateo", "Chloe", "Omar", "Priya", "Lucas",
+]
+LAST_NAMES = [
+    "Kareem", "Desai", "Haddad", "Al-Farsi", "El-Tahir", "Dupont", "Müller", "O'Sullivan", "Ferrari", "Monteiro",
+    "Tanaka", "Sato", "Bennett", "Schmidt", "Rossi", "Garcia", "Laurent", "Nasser", "Iyer", "Silva",
+]
+CITIES = ["London", "Paris", "Tokyo", "Dubai", "Milan", "Monaco", "New York", "San Francisco", "Santorini", "Kyoto"]
+RESTAURANTS = ["Nobu", "The Ivy", "Le Bernardin", "Osteria Francescana", "Sketch", "Zuma", "Per Se", "Noma"]
+ITEMS = ["cars", "dogs", "houses", "boats", "watches", "paintings"]
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+TEMPLATES = [
+    "I'm planning a trip to {city} next {weekday}.",
+    "Please book a table for {n} at {restaurant} this {weekday}.",
+    "I have {n} {item} now, can you arrange insurance for all of them?",
+    "My favorite restaurants are {restaurant} and {restaurant2}.",
+    "I need {n} tickets for the opera in {city} on {weekday} evening.",
+    "Can you confirm my flight to {city} on {date}?",
+    "Please arrange a private car from the airport when I land in {city}.",
+    "Update my profile: I moved to {city} last month.",
+]
+
+START = datetime(2024, 11, 1, tzinfo=timezone.utc)
+
+
+def user_for(user_index: int) -> tuple:
+    """(user_id, user_name) of the user_index-th synthetic member."""
+    first = FIRST_NAMES[user_index % len(FIRST_NAMES)]
+    last = LAST_NAMES[(user_index // len(FIRST_NAMES)) % len(LAST_NAMES)]
+    suffix = user_index // (len(FIRST_NAMES) * len(LAST_NAMES))
+    name = f"{first} {last}" if suffix == 0 else f"{first} {last} {suffix + 1}"
+    return f"user-{user_index:06d}", name
+
+
+def synthetic_message(i: int, users: int, seed: int = 0) -> dict:
+    """Message number i of a synthetic dataset; the same (i, users, seed) always gives the same message."""
+    rng = random.Random(seed * 1_000_003 + i)
+    user_id, user_name = user_for(rng.randrange(users))
+    timestamp = START + timedelta(seconds=i * 37 + rng.randrange(3600))
+    restaurant, restaurant2 = rng.sample(RESTAURANTS, 2)
+    text = rng.choice(TEMPLATES).format(
+        city=rng.choice(CITIES),
+        weekday=rng.choice(WEEKDAYS),
+        n=rng.randint(1, 9),
+        item=rng.choice(ITEMS),
+        restaurant=restaurant,
+        restaurant2=restaurant2,
+        date=(timestamp + timedelta(days=rng.randint(1, 60))).strftime("%B %d"),
+    )
+    return {
+        "id": f"msg-{seed}-{i:08d}",
+        "user_id": user_id,
+        "user_name": user_name,
+        "timestamp": timestamp.isoformat(),
+        "message": text,
+    }
+
+
+def default_users(messages: int) -> int:
+    """Roughly 100 messages per member, like heavy real members."""
+    return max(10, messages // 100)
+
+
+class MockMessagesServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: tuple, messages: int, users: int = None, seed: int = 0, max_limit: int = 100):
+        super().__init__(address, _Handler)
+        self.messages = messages
+        self.users = users or default_users(messages)
+        self.seed = seed
+        self.max_limit = max_limit
+        self.requests = 0
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/messages"
+
+    def page(self, skip: int, limit: int) -> dict:
+        limit = max(0, min(limit, self.max_limit))
+        end = min(self.messages, skip + limit)
+        return {
+            "total": self.messages,
+            "items": [synthetic_message(i, self.users, self.seed) for i in range(max(0, skip), end)],
+        }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        if parsed.path.rstrip("/") != "/messages":
+            self.send_error(404)
+            return
+        params = parse_qs(parsed.query)
+        try:
+            skip = int(params.get("skip", ["0"])[0])
+            limit = int(params.get("limit", ["100"])[0])
+        except ValueError:
+            self.send_error(422)
+            return
+        self.server.requests += 1
+        body = json.dumps(self.server.page(skip, limit)).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_mock_server(messages: int, port: int = 0, users: int = None, seed: int = 0) -> MockMessagesServer:
+    """Serve a synthetic dataset from a daemon thread; port 0 picks a free port."""
+    server = MockMessagesServer(("127.0.0.1", port), messages, users, seed)
+    threading.Thread(target=server.serve_forever, name="mock-messages-api", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=10000, help="dataset size")
+    parser.add_argument("--users", type=int, default=None, help="distinct members (default: messages / 100)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    server = MockMessagesServer(("127.0.0.1", args.port), args.messages, args.users, args.seed)
+    print(f"Serving {args.messages} synthetic messages from {server.users} members at {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,406 @@
+"""
+Loading of the local question-answering model.
+
+Supports the stock PyTorch pipeline and an ONNX Runtime backend (optionally
+dynamically quantized to int8) for faster CPU inference. Every backend is
+optional: if its libraries are missing or loading fails, the next one in line
+is tried, ending with no local model at all.
+
+Heavy libraries are imported only when a model is actually loaded, and
+ModelLoader does that on a background thread so importing the app is cheap.
+"""
+import os
+import sys
+import threading
+import time
+from typing import Optional, Tuple
+
+QA_MODEL_NAME = "deepset/roberta-base-squad2"
+BACKENDS = ("pytorch", "onnx", "onnx-int8")
+
+# Window size and overlap the question-answering pipeline splits long contexts with (its defaults)
+PIPELINE_MAX_SEQ_LEN = 384
+PIPELINE_DOC_STRIDE = 128
+
+# Where exported/quantized ONNX models are cached between runs
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".onnx_models"))
+
+
+def load_qa_pipeline(backend: str = "pytorch", num_threads: Optional[int] = None) -> Tuple[object, Optional[str]]:
+    """
+    Build a question-answering pipeline on the requested backend.
+
+    Returns (pipeline, backend actually used); falls back to PyTorch when an
+    ONNX backend can't be loaded, and to (None, None) when nothing can.
+    """
+    if backend not in BACKENDS:
+        print(f"Warning: Unknown QA backend '{backend}', using pytorch", file=sys.stderr)
+        backend = "pytorch"
+
+    if backend.startswith("onnx"):
+        try:
+            return _load_onnx_pipeline(quantize=backend == "onnx-int8", num_threads=num_threads), backend
+        except Exception as e:
+            print(f"Warning: Could not load ONNX QA backend ({e}), falling back to pytorch", file=sys.stderr)
+
+    try:
+        return _load_pytorch_pipeline(num_threads), "pytorch"
+    except ImportError:
+        # transformers isn't installed; the app answers without a local model
+        return None, None
+    except Exception as e:
+        print(f"Warning: Could not load QA pipeline: {e}")
+        return None, None
+
+
+def _load_pytorch_pipeline(num_threads: Optional[int]):
+    from transformers import pipeline
+
+    if num_threads:
+        import torch
+        torch.set_num_threads(num_threads)
+
+    return pipeline(
+        "question-answering",
+        model=QA_MODEL_NAME,
+        tokenizer=QA_MODEL_NAME
+    )
+
+
+def _load_onnx_pipeline(quantize: bool, num_threads: Optional[int]):
+    import onnxruntime
+    from optimum.onnxruntime import ORTModelForQuestionAnswering, ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+    from transformers import AutoTokenizer, pipeline
+
+    export_dir = os.path.join(ONNX_MODEL_DIR, QA_MODEL_NAME.replace("/", "--"))
+    if not os.path.exists(os.path.join(export_dir, "model.onnx")):
+        print(f"Exporting {QA_MODEL_NAME} to ONNX in {export_dir}", file=sys.stderr)
+        model = ORTModelForQuestionAnswering.from_pretrained(QA_MODEL_NAME, export=True)
+        model.save_pretrained(export_dir)
+        AutoTokenizer.from_pretrained(QA_MODEL_NAME).save_pretrained(export_dir)
+
+    model_dir, file_name = export_dir, "model.onnx"
+    if quantize:
+        model_dir = export_dir + "-int8"
+        file_name = "model_quantized.onnx"
+        if not os.path.exists(os.path.join(model_dir, file_name)):
+            print(f"Quantizing ONNX model to int8 in {model_dir}", file=sys.stderr)
+            quantizer = ORTQuantizer.from_pretrained(export_dir)
+            qconfig = AutoQuantizationConfig.avx2(is_static=False, per_channel=False)
+            quantizer.quantize(save_dir=model_dir, quantization_config=qconfig)
+
+    session_options = onnxruntime.SessionOptions()
+    session_options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+    session_options.inter_op_num_threads = 1
+    if num_threads:
+        session_options.intra_op_num_threads = num_threads
+
+    model = ORTModelForQuestionAnswering.from_pretrained(
+        model_dir,
+        file_name=file_name,
+        provider="CPUExecutionProvider",
+        session_options=session_options
+    )
+    tokenizer = AutoTokenizer.from_pretrained(export_dir)
+    return pipeline("question-answering", model=model, tokenizer=tokenizer)
+
+
+# Synthetic inputs used to warm the model up before it takes traffic
+WARMUP_INPUTS = [
+    ("When is the member travelling?",
+     "Sample Member: Please book a flight to Paris for next Friday. (Date: 2025-01-01)"),
+    ("How many tickets are needed?",
+     "Sample Member: I need 4 tickets for the opera on Saturday evening. (Date: 2025-01-02)"),
+]
+
+
+class ModelLoader:
+    """
+    Loads the QA pipeline on a background thread and tracks its readiness.
+
+    States: not_started -> loading -> warming -> ready, or failed if no
+    local model could be loaded. The pipeline is only handed out once ready.
+    A loader created with enabled=False stays "disabled" and never imports
+    the model libraries.
+    """
+
+    def __init__(self, backend: str = "pytorch", num_threads: Optional[int] = None, warmup_batch_size: int = 1,
+                 enabled: bool = True):
+        self.backend = backend
+        self.num_threads = num_threads
+        self.warmup_batch_size = max(1, warmup_batch_size)
+        self.state = "not_started" if enabled else "disabled"
+        self.loaded_backend = None
+        self.error = None
+        self.load_seconds = None
+        self.warmup_seconds = None
+        self._pipeline = None
+        self._runner = None
+        self._on_ready = []
+        self._lock = threading.Lock()
+
+    @property
+    def is_ready(self) -> bool:
+        return self.state == "ready"
+
+    @property
+    def is_pending(self) -> bool:
+        """Enabled but not ready yet (not started, loading or warming up)."""
+        return self.state in ("not_started", "loading", "warming")
+
+    @property
+    def pipeline(self):
+        """The loaded pipeline, or None until warmup has finished."""
+        return self._pipeline if self.state == "ready" else None
+
+    @property
+    def runner(self) -> Optional["DirectQARunner"]:
+        """Token-id level runner over the same model, once ready."""
+        return self._runner if self.state == "ready" else None
+
+    @property
+    def tokenizer(self):
+        return self._pipeline.tokenizer if self.state == "ready" else None
+
+    def on_ready(self, callback):
+        """Register a callable run (on the loader thread) once the model is ready."""
+        self._on_ready.append(callback)
+
+    def start(self):
+        """Begin loading in a daemon thread; later calls are no-ops."""
+        with self._lock:
+            if self.state != "not_started":
+                return
+            self.state = "loading"
+        threading.Thread(target=self._load, name="qa-model-loader", daemon=True).start()
+
+    def _load(self):
+        started = time.perf_counter()
+        try:
+            qa, self.loaded_backend = load_qa_pipeline(self.backend, self.num_threads)
+            self.load_seconds = time.perf_counter() - started
+            if qa is None:
+                self.error = "no local QA model available"
+                self.state = "failed"
+                return
+
+            self.state = "warming"
+            started = time.perf_counter()
+            warmup(qa, self.warmup_batch_size)
+
+            try:
+                runner = DirectQARunner(qa.tokenizer, qa.model)
+                warmup_runner(runner, qa)
+            except Exception as e:
+                # The pipeline still works; contexts just get tokenized per request
+                print(f"Warning: Token-id QA path unavailable: {e}", file=sys.stderr)
+                runner = None
+            self.warmup_seconds = time.perf_counter() - started
+
+            self._pipeline = qa
+            self._runner = runner
+            self.state = "ready"
+        except Exception as e:
+            print(f"Warning: QA model failed to load: {e}", file=sys.stderr)
+            self.error = str(e)
+            self.state = "failed"
+            return
+
+        for callback in self._on_ready:
+            try:
+                callback(self)
+            except Exception as e:
+                print(f"Warning: QA model ready callback failed: {e}", file=sys.stderr)
+
+    def status(self) -> dict:
+        return {
+            "state": self.state,
+            "requested_backend": self.backend,
+            "backend": self.loaded_backend,
+            "load_seconds": self.load_seconds,
+            "warmup_seconds": self.warmup_seconds,
+            "error": self.error,
+        }
+
+
+def warmup(qa, batch_size: int = 1):
+    """Run synthetic single and batched inputs so the first real request isn't slow."""
+    for question, context in WARMUP_INPUTS:
+        qa(question=question, context=context)
+    if batch_size > 1:
+        pairs = (WARMUP_INPUTS * batch_size)[:batch_size]
+        qa(question=[q for q, _ in pairs], context=[c for _, c in pairs], batch_size=batch_size)
+
+
+def tokenize_lines(tokenizer, lines, batch_size: int = 512):
+    """Model token ids (without special tokens) for each context line, as a TokenIdColumn."""
+    from message_store import TokenIdColumn
+
+    def sequences():
+        for start in range(0, len(lines), batch_size):
+            batch = list(lines[start:start + batch_size])
+            yield from tokenizer(batch, add_special_tokens=False)["input_ids"]
+
+    return TokenIdColumn.from_sequences(sequences())
+
+
+def pipeline_windows(question_len: int, context_len: int, max_seq_len: int = PIPELINE_MAX_SEQ_LEN,
+                     doc_stride: int = PIPELINE_DOC_STRIDE) -> int:
+    """How many overlapping windows (model forward rows) the pipeline needs for a context, in tokens."""
+    per_window = max(1, max_seq_len - question_len - 4)
+    if context_len <= per_window:
+        return 1
+    step = max(1, per_window - min(doc_stride, per_window // 2))
+    return 1 + -(-(context_len - per_window) // step)
+
+
+def warmup_runner(runner: "DirectQARunner", qa=None, tolerance: float = 1e-3):
+    """
+    Warm the token-id path with the same synthetic inputs. Given the
+    pipeline, also check that both score them alike; raises ValueError if
+    not, so callers can fall back to the pipeline alone.
+    """
+    contexts_ids = runner.tokenizer([c for _, c in WARMUP_INPUTS], add_special_tokens=False)["input_ids"]
+    results = runner.answer_batch([q for q, _ in WARMUP_INPUTS], contexts_ids)
+    if qa is None:
+        return
+    for (question, context), result in zip(WARMUP_INPUTS, results):
+        expected = qa(question=question, context=context)["score"]
+        if abs(result["score"] - expected) > tolerance:
+            raise ValueError(
+                f"token-id path scores {result['score']:.4f} where the pipeline scores {expected:.4f} "
+                f"for {question!r}"
+            )
+
+
+class DirectQARunner:
+    """
+    Extractive QA straight from token ids.
+
+    Contexts arrive already tokenized (from the per-line token cache), so only
+    the questions are tokenized per request. Inputs are laid out the way the
+    question-answering pipeline does it for RoBERTa-style models, and spans
+    are scored like the pipeline scores them (see _best_span), which
+    warmup_runner checks against the pipeline on WARMUP_INPUTS.
+    """
+
+    def __init__(self, tokenizer, model, max_seq_len: int = 512, max_question_len: int = 64,
+                 max_answer_len: int = 15):
+        self.tokenizer = tokenizer
+        self.model = model
+        self.max_seq_len = min(max_seq_len, getattr(tokenizer, "model_max_length", max_seq_len) or max_seq_len)
+        self.max_question_len = max_question_len
+        self.max_answer_len = max_answer_len
+
+    @property
+    def special_tokens_count(self) -> int:
+        # <s> question </s></s> context </s>
+        return 4
+
+    def context_budget(self, question_len: int) -> int:
+        """How many context tokens fit in one window next to a question of this length."""
+        return self.max_seq_len - min(question_len, self.max_question_len) - self.special_tokens_count
+
+    def answer_batch(self, questions: list, contexts_ids: list) -> list:
+        """Answer (question, context ids) pairs as one padded batch; returns [{"answer", "score"}]."""
+        import numpy as np
+
+        tok = self.tokenizer
+        question_ids = tok(list(questions), add_special_tokens=False)["input_ids"]
+        cls_id, sep_id, pad_id = tok.cls_token_id, tok.sep_token_id, tok.pad_token_id
+
+        rows, spans = [], []
+        for q_ids, c_ids in zip(question_ids, contexts_ids):
+            q_ids = list(q_ids[:self.max_question_len])
+            c_ids = list(c_ids[:self.max_seq_len - len(q_ids) - self.special_tokens_count])
+            row = [cls_id] + q_ids + [sep_id, sep_id] + c_ids + [sep_id]
+            context_start = len(q_ids) + 3
+            rows.append(row)
+            spans.append((context_start, context_start + len(c_ids), c_ids))
+
+        width = max(len(row) for row in rows)
+        input_ids = np.full((len(rows), width), pad_id, dtype=np.int64)
+        attention_mask = np.zeros((len(rows), width), dtype=np.int64)
+        for i, row in enumerate(rows):
+            input_ids[i, :len(row)] = row
+            attention_mask[i, :len(row)] = 1
+
+        start_logits, end_logits = self._forward(input_ids, attention_mask)
+
+        results = []
+        for i, (context_start, context_end, c_ids) in enumerate(spans):
+            if context_end <= context_start:
+                results.append({"answer": "", "score": 0.0})
+                continue
+            start, end, score = self._best_span(start_logits[i], end_logits[i], context_start, context_end)
+            answer = tok.decode(c_ids[start:end + 1], skip_special_tokens=True).strip()
+            results.append({"answer": answer, "score": score})
+        return results
+
+    def answer_chunks(self, question: str, chunks: list, batch_size: int = 8, min_score: float = None) -> dict:
+        """
+        Best span for one question across many context chunks (token id
+        lists, most promising first), run batch_size chunks per forward pass.
+        Each chunk is scored on its own, like one pipeline window, and the
+        best span wins as it does across the pipeline's windows. Stops after
+        the batch in which a span scores at least min_score, if given.
+        Returns {"answer", "score", "windows"} where windows counts the chunks run.
+        """
+        best = {"answer": "", "score": 0.0}
+        windows = 0
+        for start in range(0, len(chunks), max(1, batch_size)):
+            batch = chunks[start:start + batch_size]
+            for result in self.answer_batch([question] * len(batch), batch):
+                if result["answer"] and result["score"] > best["score"]:
+                    best = result
+            windows += len(batch)
+            if min_score is not None and best["score"] >= min_score:
+                break
+        return dict(best, windows=windows)
+
+    def _forward(self, input_ids, attention_mask):
+        import numpy as np
+
+        try:
+            import torch
+            with torch.no_grad():
+                outputs = self.model(
+                    input_ids=torch.from_numpy(input_ids),
+                    attention_mask=torch.from_numpy(attention_mask)
+                )
+        except ImportError:
+            # ONNX Runtime models also accept numpy inputs
+            outputs = self.model(input_ids=input_ids, attention_mask=attention_mask)
+
+        def to_numpy(logits):
+            return logits.detach().cpu().numpy() if hasattr(logits, "detach") else np.asarray(logits)
+
+        return to_numpy(outputs.start_logits), to_numpy(outputs.end_logits)
+
+    def _best_span(self, start_logits, end_logits, context_start: int, context_end: int):
+        """
+        Highest p(start) * p(end) context span with end >= start and a bounded
+        length, from one row's logits. As in the pipeline, the softmax runs
+        over the context tokens plus <s> (everything else is masked), and <s>,
+        the "no answer" position, is zeroed only afterwards: its share of the
+        probability mass lowers the scores of unanswerable contexts.
+        Returns (start, end, score) with start and end relative to context_start.
+        """
+        import numpy as np
+
+        keep = np.zeros(len(start_logits), dtype=bool)
+        keep[0] = True
+        keep[context_start:context_end] = True
+
+        def context_probabilities(logits):
+            x = np.where(keep, logits, -10000.0)
+            e = np.exp(x - x.max())
+            return (e / e.sum())[context_start:context_end]
+
+        p_start, p_end = context_probabilities(start_logits), context_probabilities(end_logits)
+        scores = np.triu(np.outer(p_start, p_end))
+        scores = np.tril(scores, self.max_answer_len - 1)
+        flat = int(np.argmax(scores))
+        start, end = divmod(flat, scores.shape[1])
+        return start, end, float(scores[start, end])
@@ -0,0 +1,182 @@
+"""
+Optional dense retrieval over member messages.
+
+Every message is embedded once with a small local sentence-embedding model.
+The normalized vectors live in one contiguous float32 matrix, or an int8
+matrix with per-row scales when quantized. Nearest neighbours for a batch of
+queries come from a single matrix product. Matrices are saved to disk under
+the snapshot version, so a restart with unchanged data memory-maps them
+instead of re-embedding.
+
+Needs numpy and sentence-transformers; when either is missing the app keeps
+using keyword ranking only.
+"""
+import os
+import sys
+import threading
+from typing import Optional
+
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+EMBEDDING_CACHE_DIR = os.getenv(
+    "EMBEDDING_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".embeddings")
+)
+
+# Rows scored per matrix product, to bound temporary memory on large stores
+SEARCH_CHUNK_ROWS = 65536
+
+
+class Embedder:
+    """Lazily loaded sentence-embedding model producing L2-normalized float32 vectors."""
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL):
+        self.model_name = model_name
+        self._model = None
+        self._lock = threading.Lock()
+
+    def _get_model(self):
+        with self._lock:
+            if self._model is None:
+                from sentence_transformers import SentenceTransformer
+                self._model = SentenceTransformer(self.model_name, device="cpu")
+        return self._model
+
+    def encode(self, texts: list, batch_size: int = 64):
+        import numpy as np
+
+        vectors = self._get_model().encode(
+            list(texts), batch_size=batch_size, normalize_embeddings=True,
+            convert_to_numpy=True, show_progress_bar=False
+        )
+        return np.ascontiguousarray(vectors, dtype=np.float32)
+
+
+class SemanticIndex:
+    """Message embeddings as one matrix, searchable with batched dot products."""
+
+    def __init__(self, matrix, scales=None):
+        # float32 (n, dim) rows, or int8 rows with a float32 scale per row
+        self.matrix = matrix
+        self.scales = scales
+
+    @property
+    def quantized(self) -> bool:
+        return self.scales is not None
+
+    def __len__(self) -> int:
+        return self.matrix.shape[0]
+
+    @classmethod
+    def build(cls, embedder: Embedder, texts: list, quantize: bool = False) -> "SemanticIndex":
+        vectors = embedder.encode(texts)
+        if not quantize:
+            return cls(vectors)
+        return cls(*quantize_rows(vectors))
+
+    @staticmethod
+    def _paths(directory: str, version: str, model_name: str, quantize: bool) -> tuple:
+        prefix = os.path.join(directory, f"{model_name.replace('/', '--')}-{version}")
+        if quantize:
+            return prefix + ".i8.npy", prefix + ".scales.npy"
+        return prefix + ".f32.npy", None
+
+    def save(self, directory: str, version: str, model_name: str = EMBEDDING_MODEL):
+        import numpy as np
+
+        os.makedirs(directory, exist_ok=True)
+        matrix_path, scales_path = self._paths(directory, version, model_name, self.quantized)
+        # Write then rename so a concurrent reader never maps a partial file
+        for path, array in ((matrix_path, self.matrix), (scales_path, self.scales)):
+            if path is None:
+                continue
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                np.save(f, array)
+            os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, directory: str, version: str, model_name: str = EMBEDDING_MODEL,
+             quantize: bool = False) -> Optional["SemanticIndex"]:
+        """Memory-map a saved index for this snapshot version, or None if there isn't one."""
+        import numpy as np
+
+        matrix_path, scales_path = cls._paths(directory, version, model_name, quantize)
+        if not os.path.exists(matrix_path) or (scales_path and not os.path.exists(scales_path)):
+            return None
+        matrix = np.load(matrix_path, mmap_mode="r")
+        scales = np.load(scales_path, mmap_mode="r") if scales_path else None
+        return cls(matrix, scales)
+
+    def scores(self, query_vectors, row_ids=None):
+        """Cosine similarity of each query (rows of query_vectors) to each message, shape (q, n)."""
+        import numpy as np
+
+        queries = np.asarray(query_vectors, dtype=np.float32)
+        if queries.ndim == 1:
+            queries = queries[None, :]
+        matrix = self.matrix if row_ids is None else self.matrix[np.asarray(row_ids, dtype=np.int64)]
+        scales = None
+        if self.scales is not None:
+            scales = self.scales if row_ids is None else self.scales[np.asarray(row_ids, dtype=np.int64)]
+
+        out = np.empty((queries.shape[0], matrix.shape[0]), dtype=np.float32)
+        for start in range(0, matrix.shape[0], SEARCH_CHUNK_ROWS):
+            chunk = matrix[start:start + SEARCH_CHUNK_ROWS]
+            if scales is not None:
+                chunk = chunk.astype(np.float32) * scales[start:start + SEARCH_CHUNK_ROWS, None]
+            out[:, start:start + chunk.shape[0]] = queries @ chunk.T
+        return out
+
+    def search(self, query_vectors, k: int, row_ids=None) -> list:
+        """Top-k message ids per query, best first (restricted to row_ids if given)."""
+        import numpy as np
+
+        scores = self.scores(query_vectors, row_ids)
+        k = min(k, scores.shape[1])
+        if k <= 0:
+            return [[] for _ in range(scores.shape[0])]
+        results = []
+        for row in scores:
+            top = np.argpartition(-row, k - 1)[:k]
+            top = top[np.argsort(-row[top])]
+            if row_ids is not None:
+                results.append([int(row_ids[i]) for i in top])
+            else:
+                results.append([int(i) for i in top])
+        return results
+
+
+def quantize_rows(vectors) -> tuple:
+    """Symmetric per-row int8 quantization: returns (int8 matrix, float32 scales)."""
+    import numpy as np
+
+    max_abs = np.abs(vectors).max(axis=1)
+    scales = np.where(max_abs > 0, max_abs / 127.0, 1.0).astype(np.float32)
+    quantized = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return quantized, scales
+
+
+def load_or_build(embedder: Embedder, texts: list, version: str, quantize: bool = False,
+                  directory: str = EMBEDDING_CACHE_DIR) -> Optional[SemanticIndex]:
+    """Index for a snapshot: memory-mapped from disk when present, else embedded and saved."""
+    try:
+        index = SemanticIndex.load(directory, version, embedder.model_name, quantize)
+        if index is not None and len(index) == len(texts):
+            return index
+        index = SemanticIndex.build(embedder, texts, quantize)
+        try:
+            index.save(directory, version, embedder.model_name)
+        except OSError as e:
+            print(f"Warning: Could not persist embeddings: {e}", file=sys.stderr)
+        return index
+    except ImportError:
+        print("Warning: semantic retrieval needs numpy and sentence-transformers; disabled", file=sys.stderr)
+        return None
+
+
+def reciprocal_rank_fusion(*rankings, k: int = 60) -> list:
+    """Merge ranked id lists; ids ranked highly by any list come first."""
+    scores = {}
+    for ranking in rankings:
+        for rank, msg_id in enumerate(ranking):
+            scores[msg_id] = scores.get(msg_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=lambda msg_id: -scores[msg_id])
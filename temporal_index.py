@@ -0,0 +1,181 @@
+"""
+Ingest-time index of the dates members mention.
+
+Every message is scanned once for date expressions: ISO dates, "March 14",
+"14th of March", weekdays ("next Friday"), and relative words ("tomorrow",
+"next week", "in 3 days"). Each expression is resolved against the
+message's own timestamp, so "next Friday" becomes a calendar date. The
+results are stored per member as one timeline sorted by resolved date, in
+flat arrays with a (start, end) span per member, so reading a member's dates
+is a slice.
+"""
+import re
+from array import array
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional
+
+MONTHS = {
+    "jan": 1, "feb": 2, "mar": 3, "apr": 4, "may": 5, "jun": 6,
+    "jul": 7, "aug": 8, "sep": 9, "oct": 10, "nov": 11, "dec": 12,
+}
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+NUMBER_WORDS = {"a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7}
+
+_MONTH = r"(jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?|sept?(?:ember)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)\.?"
+_DAY = r"(\d{1,2})(?:st|nd|rd|th)?"
+_YEAR = r"(?:,?\s+(\d{4}))?"
+
+_ISO_RE = re.compile(r"\b(\d{4})-(\d{2})-(\d{2})\b")
+_MONTH_DAY_RE = re.compile(rf"\b{_MONTH}\s+{_DAY}\b{_YEAR}", re.IGNORECASE)
+_DAY_MONTH_RE = re.compile(rf"\b{_DAY}\s+(?:of\s+)?{_MONTH}\b{_YEAR}", re.IGNORECASE)
+_WEEKDAY_RE = re.compile(r"\b(?:(this|next|on|coming)\s+)?(" + "|".join(WEEKDAYS) + r")\b", re.IGNORECASE)
+_RELATIVE_RE = re.compile(
+    r"\b(today|tonight|tomorrow|yesterday|this weekend|next weekend|next week|next month|next year"
+    r"|in\s+(\d+|an?|one|two|three|four|five|six|seven)\s+(day|week|month)s?)\b",
+    re.IGNORECASE
+)
+
+# Month-day dates without a year this far before the message are taken to mean next year
+_PAST_TOLERANCE = timedelta(days=30)
+
+
+def _safe_date(year: int, month: int, day: int) -> Optional[date]:
+    try:
+        return date(year, month, day)
+    except ValueError:
+        return None
+
+
+def _add_months(day: date, months: int) -> date:
+    month_index = day.month - 1 + months
+    return date(day.year + month_index // 12, month_index % 12 + 1, 1)
+
+
+def _month_day(month_name: str, day: str, year: Optional[str], reference: Optional[date]) -> Optional[date]:
+    month = MONTHS[month_name[:3].lower()]
+    if year:
+        return _safe_date(int(year), month, int(day))
+    if reference is None:
+        return None
+    resolved = _safe_date(reference.year, month, int(day))
+    if resolved is not None and resolved < reference - _PAST_TOLERANCE:
+        resolved = _safe_date(reference.year + 1, month, int(day))
+    return resolved
+
+
+def _relative(expression: str, amount: Optional[str], unit: Optional[str], reference: date) -> date:
+    expression = expression.lower()
+    if expression in ("today", "tonight"):
+        return reference
+    if expression == "tomorrow":
+        return reference + timedelta(days=1)
+    if expression == "yesterday":
+        return reference - timedelta(days=1)
+    if expression in ("this weekend", "next weekend"):
+        days = (5 - reference.weekday()) % 7 or 7
+        return reference + timedelta(days=days + (7 if expression == "next weekend" else 0))
+    if expression == "next week":
+        return reference + timedelta(days=7 - reference.weekday())
+    if expression == "next month":
+        return _add_months(reference, 1)
+    if expression == "next year":
+        return date(reference.year + 1, 1, 1)
+    count = int(amount) if amount.isdigit() else NUMBER_WORDS[amount.lower()]
+    unit = unit.lower()
+    if unit == "day":
+        return reference + timedelta(days=count)
+    if unit == "week":
+        return reference + timedelta(weeks=count)
+    return _add_months(reference, count)
+
+
+def extract_dates(text: str, reference: Optional[date]) -> list:
+    """
+    (resolved date, expression) pairs for the date expressions in text, in
+    order of appearance. Relative expressions need a reference date (the
+    message's own date) and are skipped without one.
+    """
+    found = []  # (position, date, expression)
+    taken = []  # spans already matched by a more specific pattern
+
+    def add(match, resolved):
+        if resolved is None:
+            return
+        start, end = match.span()
+        if any(start < t_end and t_start < end for t_start, t_end in taken):
+            return
+        taken.append((start, end))
+        found.append((start, resolved, match.group(0)))
+
+    for match in _ISO_RE.finditer(text):
+        add(match, _safe_date(int(match.group(1)), int(match.group(2)), int(match.group(3))))
+    for match in _MONTH_DAY_RE.finditer(text):
+        add(match, _month_day(match.group(1), match.group(2), match.group(3), reference))
+    for match in _DAY_MONTH_RE.finditer(text):
+        add(match, _month_day(match.group(2), match.group(1), match.group(3), reference))
+    if reference is not None:
+        for match in _WEEKDAY_RE.finditer(text):
+            # The next such weekday after the message ("Friday" said on a Friday means a week later)
+            days = (WEEKDAYS.index(match.group(2).lower()) - reference.weekday()) % 7 or 7
+            add(match, reference + timedelta(days=days))
+        for match in _RELATIVE_RE.finditer(text):
+            add(match, _relative(match.group(1), match.group(2), match.group(3), reference))
+
+    found.sort(key=lambda item: item[0])
+    return [(resolved, expression) for _, resolved, expression in found]
+
+
+def epoch_date(epoch: int) -> Optional[date]:
+    """UTC calendar date of an epoch from MessageStore.epochs, or None if unknown."""
+    if not epoch:
+        return None
+    return datetime.fromtimestamp(epoch, timezone.utc).date()
+
+
+class TemporalIndex:
+    """
+    Per-member timelines of mentioned dates.
+
+    days, msg_ids and expressions are parallel flat columns (date ordinals,
+    the message each date came from, the original wording). Each member's
+    entries are a contiguous slice sorted by date; spans maps user key ->
+    (start, end) of that slice.
+    """
+
+    def __init__(self, spans: dict, days, msg_ids, expressions):
+        self.spans = spans
+        self.days = days
+        self.msg_ids = msg_ids
+        self.expressions = expressions
+
+    @classmethod
+    def build(cls, store, by_user: dict) -> "TemporalIndex":
+        spans = {}
+        days, msg_ids, expressions = array("i"), array("I"), []
+        for user_key, user_msg_ids in by_user.items():
+            entries = []
+            for msg_id in user_msg_ids:
+                reference = epoch_date(store.epochs[msg_id])
+                seen = set()
+                for resolved, expression in extract_dates(store.texts[msg_id], reference):
+                    if resolved not in seen:
+                        seen.add(resolved)
+                        entries.append((resolved.toordinal(), msg_id, expression))
+            if not entries:
+                continue
+            entries.sort()
+            start = len(days)
+            for ordinal, msg_id, expression in entries:
+                days.append(ordinal)
+                msg_ids.append(msg_id)
+                expressions.append(expression)
+            spans[user_key] = (start, len(days))
+        return cls(spans, days, msg_ids, expressions)
+
+    def __len__(self) -> int:
+        return len(self.days)
+
+    def entries(self, user_key: str) -> list:
+        """(date, message id, expression) for every date the member mentioned, earliest first."""
+        start, end = self.spans.get(user_key, (0, 0))
+        return [(date.fromordinal(self.days[i]), self.msg_ids[i], self.expressions[i]) for i in range(start, end)]
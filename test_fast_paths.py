@@ -0,0 +1,67 @@
+"""Checks that the fact and timeline lookups only answer for one unambiguously named member."""
+import os
+
+# Keep the app from loading a model or reading snapshot files on import
+os.environ.setdefault("LOCAL_MODEL", "0")
+os.environ.setdefault("SNAPSHOT_FILE", "")
+os.environ.setdefault("SNAPSHOT_BUNDLE", "")
+
+import app
+from message_cache import MessagesSnapshot
+
+MESSAGES = [
+    ("u1", "Omar Haddad", "2025-03-03T10:00:00+00:00", "Update my profile: I moved to Santorini last month."),
+    ("u2", "Omar Kareem", "2025-03-04T10:00:00+00:00", "I moved to Dubai, please update my address."),
+    ("u3", "Layla Kareem", "2025-03-05T10:00:00+00:00", "I have 2 cars now, can you arrange insurance?"),
+    ("u3", "Layla Kareem", "2025-03-10T10:00:00+00:00", "I'm planning a trip to London next Friday."),
+    ("u4", "Layla Desai", "2025-03-06T10:00:00+00:00", "I have 5 cars now, can you arrange insurance?"),
+    ("u4", "Layla Desai", "2025-03-11T10:00:00+00:00", "I'm planning a trip to London on Saturday."),
+    ("u5", "Vikram Desai", "2025-03-07T10:00:00+00:00", "I have 4 cars now, can you arrange insurance?"),
+]
+
+
+def make_snapshot() -> MessagesSnapshot:
+    return MessagesSnapshot(
+        [{"id": f"m{i}", "user_id": user_id, "user_name": name, "timestamp": timestamp, "message": text}
+         for i, (user_id, name, timestamp, text) in enumerate(MESSAGES)],
+        generation=1
+    )
+
+
+def test_fact_for_unique_member():
+    result = app.answer_from_facts("How many cars does Vikram Desai have?", make_snapshot())
+    assert result is not None and result["source"] == "facts"
+    assert "4 cars" in result["answer"]
+
+
+def test_fact_partial_name_falls_through():
+    snapshot = make_snapshot()
+    # No Omar Nasser exists; neither Omar may answer for him
+    assert app.answer_from_facts("Where did Omar Nasser move to?", snapshot) is None
+    assert app.answer_from_facts("Where does Omar Nasser live?", snapshot) is None
+
+
+def test_fact_ambiguous_first_name_falls_through():
+    snapshot = make_snapshot()
+    assert app.answer_from_facts("How many cars does Layla have?", snapshot) is None
+    result = app.answer_from_facts("How many cars does Layla Desai have?", snapshot)
+    assert result is not None and "5 cars" in result["answer"]
+
+
+def test_timeline_for_unique_member():
+    result = app.answer_from_timeline("When is Layla Kareem planning a trip to London?", make_snapshot())
+    assert result is not None and result["source"] == "timeline"
+    assert "March 14, 2025" in result["answer"]
+
+
+def test_timeline_ambiguous_or_partial_name_falls_through():
+    snapshot = make_snapshot()
+    assert app.answer_from_timeline("When is Layla planning a trip to London?", snapshot) is None
+    assert app.answer_from_timeline("When is Layla Nasser planning a trip to London?", snapshot) is None
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"{name}: ok")